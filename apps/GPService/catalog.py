@@ -0,0 +1,102 @@
+import bisect
+import logging
+import threading
+import time
+
+from django.db import connections
+
+from apps.common.cache import get_cache_version, bump_cache_version
+from project import settings
+from .models import Medicine
+from .services import get_search_terms, search_medicines
+
+CATALOG_VERSION_KEY = 'medicines:catalog'
+
+logger = logging.getLogger('apps.GPService.catalog')
+
+
+class MedicinePrefixIndex:
+    """In-process index of the words of every medicine name, answering autocomplete without a query.
+
+    Words are kept sorted so the medicines matching a prefix are found with a binary search. The index is
+    rebuilt when a medicine changes (tracked with a cache version shared by all processes) or after
+    MEDICINE_PREFIX_INDEX_TTL seconds. Rebuilds run in a background thread, meanwhile the previous index
+    keeps answering, or the database's full-text index until the first build is done.
+    """
+
+    def __init__(self, background=True):
+        self.background = background
+        self.lock = threading.Lock()
+        self.rebuild_thread = None
+        self.version = None
+        self.built_at = 0
+        # (sorted words, medicine id of each word, medicines by id), swapped at once when rebuilt
+        self.entries = ([], [], {})
+
+    def build(self, version):
+        medicines, entries = {}, []
+        for pk, name, medicine_type in Medicine.objects.values_list('id', 'name', 'type').iterator():
+            words = get_search_terms(name) + get_search_terms(medicine_type)
+            medicines[pk] = {'id': pk, 'name': name, 'type': medicine_type, 'words': words}
+            entries.extend((word, pk) for word in set(words))
+        entries.sort()
+
+        self.entries = ([word for word, _ in entries], [pk for _, pk in entries], medicines)
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def refresh(self):
+        version = get_cache_version(CATALOG_VERSION_KEY)
+        if version == self.version and time.monotonic() - self.built_at < settings.MEDICINE_PREFIX_INDEX_TTL:
+            return
+        # Held for the whole rebuild, at most one runs at a time
+        if not self.lock.acquire(blocking=False):
+            return
+        if not self.background:
+            try:
+                self.build(version)
+            finally:
+                self.lock.release()
+            return
+        self.rebuild_thread = threading.Thread(target=self.build_in_background, args=(version,), daemon=True)
+        self.rebuild_thread.start()
+
+    def build_in_background(self, version):
+        try:
+            self.build(version)
+        except Exception:
+            logger.exception('Could not rebuild the medicine prefix index')
+        finally:
+            connections.close_all()
+            self.lock.release()
+
+    def search(self, text, medicine_type=None, limit=10):
+        terms = get_search_terms(text)
+        if not terms:
+            return []
+        self.refresh()
+        if self.version is None:
+            queryset = search_medicines(text, medicine_type).order_by('name', 'id')
+            return list(queryset.values('id', 'name', 'type')[:limit])
+
+        # Walk the medicines matching the longest term, usually the most selective one
+        lookup = max(terms, key=len)
+        words, ids, medicines = self.entries
+        results, seen = [], set()
+        index = bisect.bisect_left(words, lookup)
+        while index < len(words) and words[index].startswith(lookup) and len(results) < limit:
+            medicine = medicines[ids[index]]
+            index += 1
+            if medicine['id'] in seen or (medicine_type and medicine['type'] != medicine_type):
+                continue
+            if all(any(word.startswith(term) for word in medicine['words']) for term in terms):
+                seen.add(medicine['id'])
+                results.append({'id': medicine['id'], 'name': medicine['name'], 'type': medicine['type']})
+        return results
+
+
+medicine_prefix_index = MedicinePrefixIndex()
+
+
+def invalidate_medicine_catalog():
+    bump_cache_version(CATALOG_VERSION_KEY)
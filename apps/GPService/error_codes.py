@@ -0,0 +1,12 @@
+from django.db.models import TextChoices
+
+
+class GPServiceErrorCodes(TextChoices):
+    SLOT_ALREADY_BOOKED = "This availability slot has already been booked. Please choose another slot."
+    INSUFFICIENT_STOCK = "Not enough stock left for the requested medicine quantity."
+    RESERVATION_EXPIRED = "The stock reservation has expired or was released. Please reserve again."
+    UNKNOWN_QUESTIONS = "Some answered questions do not exist. Please reload the questionnaire."
+    QUESTIONS_OF_OTHER_TREATMENT = "Some answered questions belong to another treatment."
+    DUPLICATE_ANSWERS = "A question was answered more than once."
+    TOO_MANY_ANSWERS = "A questionnaire cannot have more than 200 answers."
+    FORM_ASSESSMENT_LEASED = "This form assessment is being reviewed by another doctor or was already assessed."
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from apps.GPService.synthetic import SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = 'Writes doctors, patients, availabilities, appointments, form assessments, prescriptions and orders ' \
+           'for load testing, the same seed always generating the same data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Also part of the generated emails, use another seed to add more data')
+        parser.add_argument('--doctors', type=int, default=100)
+        parser.add_argument('--patients', type=int, default=10000)
+        parser.add_argument('--slots-per-doctor', type=int, default=500)
+        parser.add_argument('--booking-rate', type=float, default=0.3, help='Share of availabilities booked')
+        parser.add_argument('--forms-per-patient', type=float, default=1.0)
+        parser.add_argument('--assessed-rate', type=float, default=0.5, help='Share of form assessments assessed')
+        parser.add_argument('--prescription-rate', type=float, default=0.5,
+                            help='Share of appointments and assessed forms with a prescription')
+        parser.add_argument('--medicines', type=int, default=50, help='Created only when there are no medicines')
+        parser.add_argument('--password', default='password', help='Password of every generated user')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per COPY statement')
+        parser.add_argument('--skip-pricing', action='store_true', help='Leave the totals of the orders empty')
+
+    def handle(self, *args, **options):
+        generator = SyntheticDataGenerator(
+            seed=options['seed'],
+            doctors=options['doctors'],
+            patients=options['patients'],
+            slots_per_doctor=options['slots_per_doctor'],
+            booking_rate=options['booking_rate'],
+            forms_per_patient=options['forms_per_patient'],
+            assessed_rate=options['assessed_rate'],
+            prescription_rate=options['prescription_rate'],
+            medicines=options['medicines'],
+            password=options['password'],
+            chunk_size=options['chunk_size'],
+            stdout=self.stdout,
+        )
+        counts = generator.generate(price_orders=not options['skip_pricing'])
+        self.stdout.write(self.style.SUCCESS('Generated {} rows'.format(sum(counts.values()))))
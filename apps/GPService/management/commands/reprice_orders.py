@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.GPService.services import reprice_all_orders
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored total of every order from current medicine prices and doctor charges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        repriced = reprice_all_orders(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Repriced {} orders'.format(repriced)))
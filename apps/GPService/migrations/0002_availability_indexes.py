@@ -0,0 +1,34 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:35
+
+import datetime
+import django.core.validators
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GPService', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='availability',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.now, validators=[django.core.validators.MinValueValidator(limit_value=datetime.date.today)]),
+        ),
+        migrations.AlterField(
+            model_name='availability',
+            name='doctor_charge',
+            field=models.PositiveIntegerField(default=100),
+        ),
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(condition=models.Q(('is_booked', False)), fields=['date', 'starting_time', 'id'], name='availability_free_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(fields=['doctor', 'date', 'starting_time'], name='availability_doctor_slot_idx'),
+        ),
+    ]
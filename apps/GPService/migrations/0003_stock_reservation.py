@@ -0,0 +1,47 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GPService', '0002_availability_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('RESERVED', 'RESERVED'), ('CONFIRMED', 'CONFIRMED'), ('RELEASED', 'RELEASED')], default='RESERVED', max_length=20)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='medicine',
+            constraint=models.CheckConstraint(check=models.Q(('available_quantity__gte', 0)), name='medicine_stock_not_negative'),
+        ),
+        migrations.AddField(
+            model_name='stockreservation',
+            name='medicine',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='GPService.medicine'),
+        ),
+        migrations.AddField(
+            model_name='stockreservation',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='GPService.order'),
+        ),
+        migrations.AddField(
+            model_name='stockreservation',
+            name='prescription',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='GPService.prescription'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(condition=models.Q(('status', 'RESERVED')), fields=['expires_at'], name='reservation_expiry_idx'),
+        ),
+    ]
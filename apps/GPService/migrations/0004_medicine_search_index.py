@@ -0,0 +1,19 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:54
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GPService', '0003_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicine',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'type', config='simple'), name='medicine_search_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GPService', '0004_medicine_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('GPService', '0005_order_total_amount_decimal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formassessment',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='formassessment',
+            name='leased_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leased_formassessments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='formassessment',
+            index=models.Index(condition=models.Q(('is_assessed', False)), fields=['created_date', 'id'], name='formassessment_pending_idx'),
+        ),
+    ]
@@ -5,6 +5,8 @@ from enum import unique
 from django.utils.translation import gettext_lazy as _
 from secrets import choice
 from unittest.util import _MAX_LENGTH
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 from django.utils import timezone
 from apps.users.models import User
@@ -40,6 +42,11 @@ class OrderType(models.TextChoices):
     VIDEO_ASSESSMENT = 'VIDEO_ASSESSMENT', _('VIDEO_ASSESSMENT')
     PRESCRIPTION = 'PRESCRIPTION', _('PRESCRIPTION')
 
+class ReservationStatus(models.TextChoices):
+    RESERVED = 'RESERVED', _('RESERVED')
+    CONFIRMED = 'CONFIRMED', _('CONFIRMED')
+    RELEASED = 'RELEASED', _('RELEASED')
+
 
 #Models
 class Availability(models.Model):
@@ -53,6 +60,16 @@ class Availability(models.Model):
     is_booked = models.BooleanField(default=False)
     doctor_charge = models.PositiveIntegerField(default=100)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['date', 'starting_time', 'id'],
+                condition=models.Q(is_booked=False),
+                name='availability_free_slot_idx'
+            ),
+            models.Index(fields=['doctor', 'date', 'starting_time'], name='availability_doctor_slot_idx'),
+        ]
+
     def clean(self):
         if self.starting_time > self.ending_time:
             raise ValidationError("The starting time should not be less than the ending time")
@@ -76,6 +93,21 @@ class Medicine(models.Model):
     available_quantity = models.IntegerField()
     price = models.DecimalField(max_digits=4, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(available_quantity__gte=0), name='medicine_stock_not_negative'),
+        ]
+        indexes = [
+            GinIndex(SearchVector('name', 'type', config='simple'), name='medicine_search_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Orders are only repriced when the saved price differs from the loaded one, see apps.GPService.signals
+        instance.loaded_price = instance.__dict__.get('price')
+        return instance
+
 class FormAssessmentQuestion(models.Model):
     treatment = models.CharField(
         max_length=100,
@@ -105,6 +137,24 @@ choices=FormAssessmentType.choices
     is_assessed = models.BooleanField(default=False)
     created_date = models.DateTimeField(auto_now_add=True)
     assessed_date = models.DateTimeField(null=True)
+    # Doctor currently reviewing the form from the work queue, until the lease expires
+    leased_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='leased_formassessments'
+        )
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_date', 'id'],
+                condition=models.Q(is_assessed=False),
+                name='formassessment_pending_idx'
+            ),
+        ]
 
 class FormAssessmentAnswer(models.Model):
     form_assessment_question = models.ForeignKey(FormAssessmentQuestion, on_delete=models.CASCADE, related_name='form_assessment_answers')
@@ -150,7 +200,42 @@ class Order(models.Model):
     related_name='orders'
     )
     created_date = models.DateTimeField(timezone.now)
-    total_amount = models.IntegerField(blank=True, null=True)
+    # Materialized by apps.GPService.services.reprice_orders, never computed row by row
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+
+class StockReservation(models.Model):
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    prescription = models.ForeignKey(
+        Prescription,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='reservations'
+        )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='reservations'
+        )
+    status = models.CharField(
+        max_length=20,
+        choices=ReservationStatus.choices,
+        default=ReservationStatus.RESERVED
+        )
+    created_date = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(status=ReservationStatus.RESERVED),
+                name='reservation_expiry_idx'
+            ),
+        ]
 
 class Country(models.Model):
     name = models.CharField(max_length=50)
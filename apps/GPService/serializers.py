@@ -1,8 +1,17 @@
+from datetime import date
+
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from .models import Availability
+from apps.files.models import File
+from .error_codes import GPServiceErrorCodes
+from .models import Availability, Appointment, FormAssessment, FormAssessmentAnswer, FormAssessmentType, Medicine, \
+    MedicineType, Order, Treatment
 from rest_framework.response import Response
 
+MAX_BULK_AVAILABILITY_DAYS = 92
+MAX_FORM_ANSWERS = 200
+
+
 class AvailabilitySerializer(serializers.ModelSerializer):
     class Meta:
         model = Availability
@@ -12,3 +21,152 @@ class AvailabilitySerializer(serializers.ModelSerializer):
         instance = Availability(**data)
         instance.clean()
         return data
+
+
+class AvailabilityWindowSerializer(serializers.Serializer):
+    starting_time = serializers.TimeField()
+    ending_time = serializers.TimeField()
+
+    def validate(self, data):
+        if data['starting_time'] >= data['ending_time']:
+            raise ValidationError("The starting time of a working window should be before its ending time")
+        return data
+
+
+class AvailabilityBulkCreateSerializer(serializers.Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    windows = AvailabilityWindowSerializer(many=True, allow_empty=False)
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        required=False,
+        allow_empty=False
+    )
+    doctor_charge = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data['start_date'] < date.today():
+            raise ValidationError("Availabilities cannot be added for past dates")
+        if data['end_date'] < data['start_date']:
+            raise ValidationError("The end date should not be before the start date")
+        if (data['end_date'] - data['start_date']).days >= MAX_BULK_AVAILABILITY_DAYS:
+            raise ValidationError(
+                "Availabilities can be generated for at most {} days at once".format(MAX_BULK_AVAILABILITY_DAYS)
+            )
+        return data
+
+
+class AvailabilitySlotSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    starting_time = serializers.TimeField()
+    ending_time = serializers.TimeField()
+
+
+class AvailabilityFilterSerializer(serializers.Serializer):
+    doctor = serializers.UUIDField(required=False)
+    date = serializers.DateField(required=False)
+
+
+class AvailabilitySearchSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    time_from = serializers.TimeField(required=False)
+    time_to = serializers.TimeField(required=False)
+    doctor = serializers.UUIDField(required=False)
+    min_charge = serializers.IntegerField(min_value=0, required=False)
+    max_charge = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        data['date_from'] = max(data.get('date_from', date.today()), date.today())
+        if 'date_to' in data and data['date_to'] < data['date_from']:
+            raise ValidationError("The end of the date range should not be before its start")
+        return data
+
+
+class FreeSlotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Availability
+        fields = ('id', 'doctor', 'date', 'starting_time', 'ending_time', 'doctor_charge')
+
+
+class AppointmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Appointment
+        fields = '__all__'
+        read_only_fields = ('patient', 'availability', 'status')
+
+
+class AppointmentBookingSerializer(serializers.Serializer):
+    attachment = serializers.PrimaryKeyRelatedField(queryset=File.objects.none(), required=False, allow_null=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Patients can only attach files they uploaded themselves
+        self.fields['attachment'].queryset = File.objects.filter(uploaded_by=self.context['request'].user)
+
+
+class MedicineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Medicine
+        fields = ['id', 'name', 'type', 'available_quantity', 'price']
+
+
+class MedicineSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(required=False, allow_blank=True)
+    type = serializers.ChoiceField(choices=MedicineType.choices, required=False)
+
+
+class MedicineAutocompleteSerializer(MedicineSearchSerializer):
+    q = serializers.CharField()
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['id', 'type', 'appointment', 'form_assessment', 'created_date', 'total_amount']
+
+
+class FormAssessmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FormAssessment
+        fields = ['id', 'patient', 'doctor', 'type', 'is_assessed', 'created_date', 'assessed_date']
+
+
+class FormAssessmentAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FormAssessmentAnswer
+        fields = ['id', 'form_assessment_question', 'answer']
+
+
+class FormAssessmentReviewSerializer(FormAssessmentSerializer):
+    answers = FormAssessmentAnswerSerializer(source='form_assessment_answers', many=True, read_only=True)
+
+    class Meta(FormAssessmentSerializer.Meta):
+        fields = FormAssessmentSerializer.Meta.fields + ['lease_expires_at', 'answers']
+
+
+class FormAssessmentLeaseSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1, max_value=50, default=1)
+
+
+class FormAssessmentCompleteSerializer(serializers.Serializer):
+    feedback = serializers.CharField(required=False, allow_blank=True)
+
+
+class FormAssessmentAnswerInputSerializer(serializers.Serializer):
+    question = serializers.IntegerField(min_value=1)
+    answer = serializers.CharField()
+
+
+class FormAssessmentSubmissionSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=FormAssessmentType.choices)
+    treatment = serializers.ChoiceField(choices=Treatment.choices)
+    answers = FormAssessmentAnswerInputSerializer(many=True, allow_empty=False)
+
+    def validate_answers(self, answers):
+        if len(answers) > MAX_FORM_ANSWERS:
+            raise ValidationError(GPServiceErrorCodes.TOO_MANY_ANSWERS)
+        if len({answer['question'] for answer in answers}) < len(answers):
+            raise ValidationError(GPServiceErrorCodes.DUPLICATE_ANSWERS)
+        return answers
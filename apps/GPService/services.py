@@ -0,0 +1,469 @@
+import hashlib
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Func, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+
+from apps.common.cache import get_cache_version, bump_cache_version, ProcessCache
+from apps.common.exceptions import Conflict
+from apps.users.models import User
+from .error_codes import GPServiceErrorCodes
+from .models import Availability, Appointment, Country, FormAssessment, FormAssessmentAnswer, \
+    FormAssessmentFeedback, FormAssessmentQuestion, Medicine, Order, Prescription, RecommendedVaccine, \
+    ReservationStatus, StockReservation
+from project import settings
+
+SLOT_DURATION = timedelta(minutes=15)
+
+# Question sets by treatment
+question_sets = ProcessCache('questions')
+# Recommended vaccines of every country
+vaccine_map = ProcessCache('vaccines')
+
+
+def get_availability_cache_version_key(doctor_id, day):
+    return 'availabilities:{}:{}'.format(doctor_id or '*', day)
+
+
+def get_availability_list_cache_key(doctor_id, day, query_string):
+    version = get_cache_version(get_availability_cache_version_key(doctor_id, day))
+    return 'availabilities:list:{}:{}:{}:{}'.format(
+        doctor_id or '*', day, version, hashlib.md5(query_string.encode('utf-8')).hexdigest()
+    )
+
+
+def invalidate_availability_cache(slots):
+    """Invalidate the cached listings of the given (doctor_id, date) pairs once the transaction commits."""
+    keys = set()
+    for doctor_id, day in slots:
+        keys.add(get_availability_cache_version_key(doctor_id, day))
+        keys.add(get_availability_cache_version_key(None, day))
+
+    def bump():
+        for key in keys:
+            bump_cache_version(key)
+
+    transaction.on_commit(bump)
+
+
+def expand_availability_slots(start_date, end_date, windows, weekdays=None):
+    """Yield (date, starting_time, ending_time) for every 15 minute slot that fits in the daily windows."""
+    day = start_date
+    while day <= end_date:
+        if weekdays is None or day.weekday() in weekdays:
+            for window in windows:
+                cursor = datetime.combine(day, window['starting_time'])
+                window_end = datetime.combine(day, window['ending_time'])
+                while cursor + SLOT_DURATION <= window_end:
+                    yield day, cursor.time(), (cursor + SLOT_DURATION).time()
+                    cursor += SLOT_DURATION
+        day += timedelta(days=1)
+
+
+def generate_availability_slots(doctor, start_date, end_date, windows, weekdays=None, doctor_charge=None):
+    """Create every free slot of the given range in one transaction.
+
+    Conflicts are resolved against all of the doctor's slots in the range with a single query,
+    a slot overlapping an existing one (or another generated slot) is skipped.
+    Returns a tuple of (created availabilities, skipped slots).
+    """
+    slots = sorted(set(expand_availability_slots(start_date, end_date, windows, weekdays)))
+    extra_fields = {} if doctor_charge is None else {'doctor_charge': doctor_charge}
+
+    with transaction.atomic():
+        # Serialise slot generation per doctor so concurrent requests cannot insert the same slot twice
+        User.objects.select_for_update().filter(pk=doctor.pk).exists()
+
+        taken = defaultdict(list)
+        existing = Availability.objects.filter(
+            doctor=doctor,
+            date__range=(start_date, end_date)
+        ).values_list('date', 'starting_time', 'ending_time')
+        for day, starting_time, ending_time in existing:
+            taken[day].append((starting_time, ending_time))
+
+        created, skipped = [], []
+        for day, starting_time, ending_time in slots:
+            if any(start < ending_time and end > starting_time for start, end in taken[day]):
+                skipped.append({'date': day, 'starting_time': starting_time, 'ending_time': ending_time})
+                continue
+            taken[day].append((starting_time, ending_time))
+            created.append(Availability(
+                doctor=doctor,
+                date=day,
+                starting_time=starting_time,
+                ending_time=ending_time,
+                **extra_fields
+            ))
+
+        Availability.objects.bulk_create(created, batch_size=500)
+        invalidate_availability_cache({(doctor.pk, availability.date) for availability in created})
+
+    return created, skipped
+
+
+def search_free_slots(date_from, date_to=None, time_from=None, time_to=None, doctor=None,
+                      min_charge=None, max_charge=None):
+    """Free slots matching the filters, served by the partial index on unbooked slots."""
+    queryset = Availability.objects.filter(is_booked=False, date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    if time_from is not None:
+        queryset = queryset.filter(starting_time__gte=time_from)
+    if time_to is not None:
+        queryset = queryset.filter(ending_time__lte=time_to)
+    if doctor is not None:
+        queryset = queryset.filter(doctor_id=doctor)
+    if min_charge is not None:
+        queryset = queryset.filter(doctor_charge__gte=min_charge)
+    if max_charge is not None:
+        queryset = queryset.filter(doctor_charge__lte=max_charge)
+    return queryset
+
+
+def book_availability(availability_id, patient, attachment=None):
+    """Claim a free slot and create its appointment in one transaction.
+
+    The slot is claimed with a single conditional UPDATE, so concurrent bookings of the
+    same slot cannot both succeed: the loser updates no row and gets a Conflict.
+    """
+    with transaction.atomic():
+        claimed = Availability.objects.filter(pk=availability_id, is_booked=False).update(is_booked=True)
+        if not claimed:
+            raise Conflict(GPServiceErrorCodes.SLOT_ALREADY_BOOKED)
+        invalidate_availability_cache(
+            Availability.objects.filter(pk=availability_id).values_list('doctor_id', 'date')
+        )
+        return Appointment.objects.create(
+            patient=patient,
+            availability_id=availability_id,
+            attachment=attachment
+        )
+
+
+def get_reservation_expiry():
+    return timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+
+
+def reserve_stock(medicine_id, quantity, prescription=None, order=None):
+    """Take quantity out of a medicine's stock and hold it until the reservation is confirmed or expires.
+
+    The stock is taken with a single conditional UPDATE, concurrent reservations can never take more
+    than what is available: the ones that would go below zero update no row and get a Conflict.
+    """
+    with transaction.atomic():
+        reserved = Medicine.objects.filter(pk=medicine_id, available_quantity__gte=quantity).update(
+            available_quantity=F('available_quantity') - quantity
+        )
+        if not reserved:
+            raise Conflict(GPServiceErrorCodes.INSUFFICIENT_STOCK)
+        return StockReservation.objects.create(
+            medicine_id=medicine_id,
+            quantity=quantity,
+            prescription=prescription,
+            order=order,
+            expires_at=get_reservation_expiry()
+        )
+
+
+def update_stock(quantities, reserve):
+    """Take out (reserve) or put back {medicine_id: quantity} in one statement, returns the ids of the medicines
+    updated.
+
+    Reserving skips medicines without enough stock. Rows are locked in id order before being updated so
+    concurrent multi-item orders cannot deadlock.
+    """
+    table = connection.ops.quote_name(Medicine._meta.db_table)
+    sql = """
+        WITH stock (id, quantity) AS (VALUES {values}),
+        locked AS (
+            SELECT medicine.id FROM {table} medicine JOIN stock ON stock.id = medicine.id
+            ORDER BY medicine.id FOR UPDATE OF medicine
+        )
+        UPDATE {table} medicine SET available_quantity = medicine.available_quantity {operator} stock.quantity
+        FROM stock
+        WHERE medicine.id = stock.id AND medicine.id IN (SELECT id FROM locked) {condition}
+        RETURNING medicine.id
+    """.format(
+        values=', '.join(['(%s, %s)'] * len(quantities)),
+        table=table,
+        operator='-' if reserve else '+',
+        condition='AND medicine.available_quantity >= stock.quantity' if reserve else '',
+    )
+    params = [value for item in sorted(quantities.items()) for value in item]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def reserve_stock_bulk(items, order=None):
+    """Reserve every item of a multi-item order in one statement, all or nothing.
+
+    Items are dicts of `StockReservation` fields (`medicine_id`, `quantity` and optionally `prescription_id`).
+    Raises Conflict if any medicine does not have enough stock, nothing is reserved then.
+    """
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item['medicine_id']] += item['quantity']
+    if not quantities:
+        return []
+
+    with transaction.atomic():
+        if len(update_stock(quantities, reserve=True)) < len(quantities):
+            raise Conflict(GPServiceErrorCodes.INSUFFICIENT_STOCK)
+        expires_at = get_reservation_expiry()
+        return StockReservation.objects.bulk_create([
+            StockReservation(order=order, expires_at=expires_at, **item) for item in items
+        ])
+
+
+def confirm_reservation(reservation_id):
+    """Turn a reservation into a sale, its stock is not given back anymore."""
+    confirmed = StockReservation.objects.filter(
+        pk=reservation_id, status=ReservationStatus.RESERVED, expires_at__gt=timezone.now()
+    ).update(status=ReservationStatus.CONFIRMED)
+    if not confirmed:
+        raise Conflict(GPServiceErrorCodes.RESERVATION_EXPIRED)
+
+
+def release_reservation(reservation_id):
+    """Give the stock of a pending reservation back, returns False if it was already confirmed or released."""
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().filter(
+            pk=reservation_id, status=ReservationStatus.RESERVED
+        ).first()
+        if reservation is None:
+            return False
+        reservation.status = ReservationStatus.RELEASED
+        reservation.save(update_fields=['status'])
+        update_stock({reservation.medicine_id: reservation.quantity}, reserve=False)
+        return True
+
+
+def release_expired_reservations(batch_size=500):
+    """Give the stock of expired reservations back, returns the number of reservations released.
+
+    Reservations are claimed with SKIP LOCKED, several workers can sweep at the same time.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            reservations = list(StockReservation.objects.select_for_update(skip_locked=True).filter(
+                status=ReservationStatus.RESERVED, expires_at__lte=timezone.now()
+            ).order_by('expires_at')[:batch_size])
+            if not reservations:
+                return released
+
+            quantities = defaultdict(int)
+            for reservation in reservations:
+                quantities[reservation.medicine_id] += reservation.quantity
+            StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).update(
+                status=ReservationStatus.RELEASED
+            )
+            update_stock(quantities, reserve=False)
+            released += len(reservations)
+
+
+def get_search_terms(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def search_medicines(text=None, medicine_type=None):
+    """Medicines whose name or type has words starting with every word of `text`, served by the full-text index."""
+    queryset = Medicine.objects.all()
+    terms = get_search_terms(text or '')
+    if terms:
+        # Same expression as the index so Postgres can use it
+        queryset = queryset.annotate(search=SearchVector('name', 'type', config='simple')).filter(
+            search=SearchQuery(' & '.join(term + ':*' for term in terms), config='simple', search_type='raw')
+        )
+    if medicine_type:
+        queryset = queryset.filter(type=medicine_type)
+    return queryset
+
+
+def get_order_total_expression():
+    """Total of an order as a correlated SQL expression: its accepted prescriptions at the medicines' current
+    price plus the doctor charge of its appointment. Prescriptions the patient has not accepted are not billed."""
+    money = DecimalField(max_digits=10, decimal_places=2)
+    prescriptions_total = Prescription.objects.filter(
+        Q(appointment_id=OuterRef('appointment_id')) | Q(form_assessment_id=OuterRef('form_assessment_id')),
+        is_accepted=True
+    ).annotate(
+        total=Func(F('prescribed_quantity') * F('medicine__price'), function='SUM', output_field=money)
+    ).values('total')
+    doctor_charge = Availability.objects.filter(appointments=OuterRef('appointment_id')).values('doctor_charge')[:1]
+    return ExpressionWrapper(
+        Coalesce(Subquery(prescriptions_total), Value(0), output_field=money)
+        + Coalesce(Subquery(doctor_charge), Value(0), output_field=money),
+        output_field=money
+    )
+
+
+def reprice_orders(orders):
+    """Store the total of every order of the queryset with a single UPDATE, returns the number of orders."""
+    return orders.update(total_amount=get_order_total_expression())
+
+
+def reprice_orders_of_prescription(prescription):
+    conditions = Q()
+    if prescription.appointment_id:
+        conditions |= Q(appointment_id=prescription.appointment_id)
+    if prescription.form_assessment_id:
+        conditions |= Q(form_assessment_id=prescription.form_assessment_id)
+    if conditions:
+        reprice_orders(Order.objects.filter(conditions))
+
+
+def reprice_orders_of_medicine(medicine):
+    prescriptions = Prescription.objects.filter(medicine=medicine, is_accepted=True)
+    reprice_orders(Order.objects.filter(
+        Q(appointment_id__in=prescriptions.values('appointment_id'))
+        | Q(form_assessment_id__in=prescriptions.values('form_assessment_id'))
+    ))
+
+
+def reprice_all_orders(batch_size=1000):
+    """Reprice every order in id ranges of `batch_size`, one UPDATE per range, returns the number of orders."""
+    repriced, last_pk = 0, 0
+    while True:
+        pks = list(Order.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return repriced
+        repriced += reprice_orders(Order.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]))
+        last_pk = pks[-1]
+
+
+def get_question_set(treatment):
+    """Return the ETag and questions of a treatment, kept in memory until any question changes."""
+    etag, questions = question_sets.get(treatment, lambda: list(
+        FormAssessmentQuestion.objects.filter(treatment=treatment).order_by('id').values('id', 'treatment', 'question')
+    ), settings.PROCESS_CACHE_TTL)
+    return '"{}-{}"'.format(treatment, etag), questions
+
+
+def invalidate_question_sets():
+    transaction.on_commit(question_sets.invalidate)
+
+
+def load_vaccine_map():
+    """Countries by id with their recommended vaccines and medicines, in two queries."""
+    vaccines = RecommendedVaccine.objects.select_related('medicine').order_by('posted_date', 'id')
+    countries = {}
+    for country in Country.objects.order_by('name', 'id').prefetch_related(
+        Prefetch('recommended_vaccines', queryset=vaccines)
+    ):
+        countries[country.id] = {
+            'id': country.id,
+            'name': country.name,
+            'recommended_vaccines': [
+                {
+                    'id': vaccine.id,
+                    'posted_date': vaccine.posted_date.isoformat() if vaccine.posted_date else None,
+                    'medicine': vaccine.medicine and {
+                        'id': vaccine.medicine.id,
+                        'name': vaccine.medicine.name,
+                        'type': vaccine.medicine.type,
+                        'price': str(vaccine.medicine.price),
+                    },
+                }
+                for vaccine in country.recommended_vaccines.all()
+            ],
+        }
+    return countries
+
+
+def get_vaccine_map():
+    """Return the ETag and the recommended vaccines by country id, kept in memory until a vaccine changes."""
+    etag, countries = vaccine_map.get('countries', load_vaccine_map, settings.PROCESS_CACHE_TTL)
+    return '"vaccines-{}"'.format(etag), countries
+
+
+def invalidate_vaccine_map():
+    transaction.on_commit(vaccine_map.invalidate)
+
+
+def submit_form_assessment(patient, type, treatment, answers):
+    """Create an assessment with all its answers in one transaction, in a constant number of queries.
+
+    Every answered question is checked with a single query, they must all be questions of `treatment`.
+    Returns the assessment and its answers.
+    """
+    question_ids = [answer['question'] for answer in answers]
+    treatments = dict(FormAssessmentQuestion.objects.filter(pk__in=question_ids).values_list('pk', 'treatment'))
+    if len(treatments) < len(question_ids):
+        raise ValidationError({'answers': [GPServiceErrorCodes.UNKNOWN_QUESTIONS]})
+    if any(question_treatment != treatment for question_treatment in treatments.values()):
+        raise ValidationError({'answers': [GPServiceErrorCodes.QUESTIONS_OF_OTHER_TREATMENT]})
+
+    with transaction.atomic():
+        assessment = FormAssessment.objects.create(patient=patient, type=type)
+        created = FormAssessmentAnswer.objects.bulk_create([
+            FormAssessmentAnswer(
+                form_assessment=assessment,
+                form_assessment_question_id=answer['question'],
+                answer=answer['answer']
+            )
+            for answer in answers
+        ])
+    return assessment, created
+
+
+def get_leasable_form_assessments(doctor, now):
+    """Pending forms not leased, whose lease expired, or already leased by the doctor, oldest first."""
+    return FormAssessment.objects.filter(is_assessed=False).filter(
+        Q(leased_by__isnull=True) | Q(lease_expires_at__lte=now) | Q(leased_by=doctor)
+    ).order_by('created_date', 'id')
+
+
+def lease_form_assessments(doctor, count):
+    """Lease the next `count` pending forms to a doctor for FORM_ASSESSMENT_LEASE_TIMEOUT seconds.
+
+    Rows locked by doctors leasing at the same time are skipped (SKIP LOCKED), so concurrent doctors get
+    different forms without waiting on each other.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pks = list(get_leasable_form_assessments(doctor, now).select_for_update(skip_locked=True).values_list(
+            'pk', flat=True
+        )[:count])
+        FormAssessment.objects.filter(pk__in=pks).update(
+            leased_by=doctor,
+            lease_expires_at=now + timedelta(seconds=settings.FORM_ASSESSMENT_LEASE_TIMEOUT)
+        )
+    return FormAssessment.objects.filter(pk__in=pks).order_by('created_date', 'id')
+
+
+def complete_form_assessment(assessment_id, doctor, feedback=None):
+    """Mark a form assessed by the doctor, unless another doctor holds its lease or it was already assessed.
+
+    Raises NotFound when the form does not exist and Conflict when it cannot be completed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        completed = FormAssessment.objects.filter(pk=assessment_id, is_assessed=False).filter(
+            Q(leased_by__isnull=True) | Q(lease_expires_at__lte=now) | Q(leased_by=doctor)
+        ).update(
+            doctor=doctor,
+            is_assessed=True,
+            assessed_date=now,
+            leased_by=None,
+            lease_expires_at=None
+        )
+        if not completed:
+            if not FormAssessment.objects.filter(pk=assessment_id).exists():
+                raise NotFound()
+            raise Conflict(GPServiceErrorCodes.FORM_ASSESSMENT_LEASED)
+        if feedback:
+            FormAssessmentFeedback.objects.create(
+                form_assessment_id=assessment_id,
+                provided_feedback=feedback,
+                posted_date=now.date()
+            )
+    return FormAssessment.objects.get(pk=assessment_id)
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import invalidate_medicine_catalog
+from .models import Availability, Country, FormAssessmentQuestion, Medicine, Order, Prescription, RecommendedVaccine
+from .services import invalidate_question_sets, invalidate_vaccine_map, reprice_orders, \
+    reprice_orders_of_medicine, reprice_orders_of_prescription
+
+
+@receiver(post_save, sender=Medicine)
+@receiver(post_delete, sender=Medicine)
+def medicine_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_medicine_catalog)
+
+
+@receiver(post_save, sender=Medicine)
+def medicine_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    if instance.price != getattr(instance, 'loaded_price', None):
+        reprice_orders_of_medicine(instance)
+        instance.loaded_price = instance.price
+
+
+@receiver(post_save, sender=Prescription)
+@receiver(post_delete, sender=Prescription)
+def prescription_changed(sender, instance, **kwargs):
+    reprice_orders_of_prescription(instance)
+
+
+@receiver(post_save, sender=Availability)
+def availability_saved(sender, instance, created, **kwargs):
+    if not created:
+        reprice_orders(Order.objects.filter(appointment__availability=instance))
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    orders = Order.objects.filter(pk=instance.pk)
+    reprice_orders(orders)
+    instance.total_amount = orders.values_list('total_amount', flat=True).get()
+
+
+@receiver(post_save, sender=FormAssessmentQuestion)
+@receiver(post_delete, sender=FormAssessmentQuestion)
+def question_changed(sender, instance, **kwargs):
+    invalidate_question_sets()
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+@receiver(post_save, sender=RecommendedVaccine)
+@receiver(post_delete, sender=RecommendedVaccine)
+@receiver(post_save, sender=Medicine)
+@receiver(post_delete, sender=Medicine)
+def vaccine_changed(sender, instance, **kwargs):
+    invalidate_vaccine_map()
@@ -0,0 +1,289 @@
+import io
+import random
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.users.models import User, Roles
+from .catalog import invalidate_medicine_catalog
+from .models import Availability, Appointment, AppointmentStatus, FormAssessment, FormAssessmentType, Medicine, \
+    MedicineType, Order, OrderType, Prescription
+from .services import reprice_orders
+
+SLOTS_PER_DAY = 32
+PRICING_BATCH_SIZE = 50000
+
+
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+COPY_FORMATTERS = {
+    type(None): lambda value: '\\N',
+    bool: lambda value: 't' if value else 'f',
+    str: lambda value: value.translate(COPY_ESCAPES),
+    int: str,
+    date: date.isoformat,
+    datetime: datetime.isoformat,
+    time: time.isoformat,
+}
+
+
+def format_copy_value(value):
+    """Text representation of a value in the COPY text format."""
+    return COPY_FORMATTERS.get(type(value), str)(value)
+
+
+class CopyWriter:
+    """Write rows of a model with COPY, `chunk_size` rows per statement.
+
+    Rows hold the values of `columns`, every other column gets its model default (evaluated once) or the
+    value given in `constants`. Signals and `save()` are bypassed.
+    """
+
+    def __init__(self, model, columns, chunk_size, **constants):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.pending = 0
+        self.buffer = io.StringIO()
+
+        suffix = []
+        now = timezone.now()
+        fields = {field.attname: field for field in model._meta.concrete_fields}
+        for name, field in fields.items():
+            if name in columns:
+                continue
+            if name in constants:
+                value = constants[name]
+            elif getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                value = now
+            else:
+                value = field.get_default()
+            suffix.append((field.column, format_copy_value(field.get_db_prep_save(value, connection))))
+
+        self.columns = [fields[name].column for name in columns] + [column for column, _ in suffix]
+        self.suffix = ''.join('\t' + value for _, value in suffix) + '\n'
+
+    def write(self, *values):
+        self.buffer.write('\t'.join(map(format_copy_value, values)) + self.suffix)
+        self.pending += 1
+        if self.pending >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(
+                connection.ops.quote_name(self.model._meta.db_table),
+                ', '.join(connection.ops.quote_name(column) for column in self.columns),
+            ), self.buffer)
+        self.count += self.pending
+        self.pending = 0
+        self.buffer = io.StringIO()
+
+
+def reserve_ids(model, count):
+    """Take `count` consecutive ids from the sequence of the model's table, returns the first one."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), nextval(pg_get_serial_sequence(%s, 'id')) + %s)",
+            [table, table, max(count - 1, 0)]
+        )
+        return cursor.fetchone()[0] - max(count - 1, 0)
+
+
+class SyntheticDataGenerator:
+    """Generate doctors, patients and their availabilities, appointments, form assessments, prescriptions
+    and orders with consistent foreign keys, the same seed always producing the same graph.
+
+    Rows are written with COPY and ids are taken from the sequences up front, so related rows can reference
+    each other without reading anything back. Every synthetic user shares one password hash.
+    """
+
+    def __init__(self, seed=0, doctors=100, patients=10000, slots_per_doctor=500, booking_rate=0.3,
+                 forms_per_patient=1.0, assessed_rate=0.5, prescription_rate=0.5, medicines=50,
+                 password='password', chunk_size=50000, stdout=None):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.doctors = doctors
+        self.patients = patients
+        self.slots_per_doctor = slots_per_doctor
+        self.booking_rate = booking_rate
+        self.forms = int(patients * forms_per_patient)
+        self.assessed_rate = assessed_rate
+        self.prescription_rate = prescription_rate
+        self.medicines = medicines
+        self.password = password
+        self.chunk_size = chunk_size
+        self.stdout = stdout
+        self.now = timezone.now()
+        self.counts = {}
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def writer(self, model, columns, **constants):
+        return CopyWriter(model, columns, self.chunk_size, **constants)
+
+    def finish(self, name, writer):
+        writer.flush()
+        self.counts[name] = writer.count
+        self.log('{}: {}'.format(name, writer.count))
+
+    def user_id(self, role, index):
+        # Ids derived from the seed, referenced without keeping every generated user in memory
+        return uuid.UUID(int=(self.user_id_base[role] + index) % 2 ** 128, version=4)
+
+    def generate_users(self):
+        self.user_id_base = {role: self.random.getrandbits(128) for role in [Roles.DOCTOR, Roles.PATIENT]}
+        writer = self.writer(
+            User, ['id', 'username', 'email', 'first_name', 'last_name', 'role'],
+            password=make_password(self.password), is_active=True, date_joined=self.now,
+        )
+        for role, count in [(Roles.DOCTOR, self.doctors), (Roles.PATIENT, self.patients)]:
+            for index in range(count):
+                email = '{}{}.{}@example.com'.format(role.lower(), index, self.seed)
+                writer.write(
+                    self.user_id(role, index), email, email, role.capitalize(), str(index), role
+                )
+        self.finish('users', writer)
+
+    def generate_medicines(self):
+        self.medicine_ids = list(Medicine.objects.order_by('id').values_list('id', flat=True))
+        if self.medicine_ids:
+            return
+        start = reserve_ids(Medicine, self.medicines)
+        writer = self.writer(Medicine, ['id', 'name', 'type', 'available_quantity', 'price'])
+        for index in range(self.medicines):
+            writer.write(
+                start + index, 'Medicine {}'.format(index), self.random.choice(MedicineType.values),
+                self.random.randrange(100, 10000),
+                '{}.{:02}'.format(self.random.randrange(1, 99), self.random.randrange(100)),
+            )
+        self.finish('medicines', writer)
+        self.medicine_ids = list(range(start, start + self.medicines))
+        transaction.on_commit(invalidate_medicine_catalog)
+
+    def generate_availabilities(self):
+        count = self.doctors * self.slots_per_doctor
+        booked = bytearray(count)
+        for index in range(count):
+            if self.random.random() < self.booking_rate:
+                booked[index] = 1
+
+        start = reserve_ids(Availability, count)
+        first_day = self.now.date() + timedelta(days=1)
+        slot_times = [
+            (time(8 + slot * 15 // 60, slot * 15 % 60), time(8 + (slot + 1) * 15 // 60, (slot + 1) * 15 % 60))
+            for slot in range(SLOTS_PER_DAY)
+        ]
+        writer = self.writer(Availability, [
+            'id', 'doctor_id', 'date', 'starting_time', 'ending_time', 'is_booked'
+        ])
+        for doctor in range(self.doctors):
+            doctor_id = self.user_id(Roles.DOCTOR, doctor)
+            for slot in range(self.slots_per_doctor):
+                index = doctor * self.slots_per_doctor + slot
+                starting_time, ending_time = slot_times[slot % SLOTS_PER_DAY]
+                writer.write(
+                    start + index, doctor_id, first_day + timedelta(days=slot // SLOTS_PER_DAY),
+                    starting_time, ending_time, booked[index] == 1,
+                )
+        self.finish('availabilities', writer)
+        return start, booked
+
+    def generate_appointments(self, availability_start, booked):
+        count = sum(booked)
+        start = reserve_ids(Appointment, count)
+        writer = self.writer(Appointment, ['id', 'patient_id', 'availability_id', 'status'])
+        statuses = [AppointmentStatus.BOOKED, AppointmentStatus.COMPLETED]
+        appointment_id = start
+        for index in range(len(booked)):
+            if booked[index]:
+                writer.write(
+                    appointment_id, self.user_id(Roles.PATIENT, self.random.randrange(self.patients)),
+                    availability_start + index, self.random.choice(statuses),
+                )
+                appointment_id += 1
+        self.finish('appointments', writer)
+        return start, count
+
+    def generate_form_assessments(self):
+        start = reserve_ids(FormAssessment, self.forms)
+        assessed = bytearray(self.forms)
+        writer = self.writer(
+            FormAssessment, ['id', 'patient_id', 'doctor_id', 'type', 'is_assessed', 'created_date', 'assessed_date']
+        )
+        for index in range(self.forms):
+            created_date = self.now - timedelta(minutes=self.random.randrange(60 * 24 * 90))
+            doctor_id = assessed_date = None
+            if self.random.random() < self.assessed_rate:
+                assessed[index] = 1
+                doctor_id = self.user_id(Roles.DOCTOR, self.random.randrange(self.doctors))
+                assessed_date = created_date + timedelta(minutes=self.random.randrange(1, 60 * 24))
+            writer.write(
+                start + index, self.user_id(Roles.PATIENT, self.random.randrange(self.patients)), doctor_id,
+                self.random.choice(FormAssessmentType.values), assessed[index] == 1, created_date, assessed_date,
+            )
+        self.finish('form_assessments', writer)
+        return start, assessed
+
+    def generate_prescriptions(self, appointment_start, appointments, form_start, assessed):
+        # Appointments and assessed forms get a prescription at `prescription_rate`, decided before taking ids
+        prescribed = bytearray(appointments + len(assessed))
+        for index in range(len(prescribed)):
+            if (index < appointments or assessed[index - appointments]) \
+                    and self.random.random() < self.prescription_rate:
+                prescribed[index] = 1
+
+        prescription_id = reserve_ids(Prescription, sum(prescribed))
+        writer = self.writer(Prescription, [
+            'id', 'medicine_id', 'prescribed_quantity', 'appointment_id', 'form_assessment_id', 'is_accepted'
+        ])
+        for index in range(len(prescribed)):
+            if not prescribed[index]:
+                continue
+            if index < appointments:
+                appointment_id, form_assessment_id = appointment_start + index, None
+            else:
+                appointment_id, form_assessment_id = None, form_start + index - appointments
+            writer.write(
+                prescription_id, self.random.choice(self.medicine_ids), self.random.randrange(1, 4),
+                appointment_id, form_assessment_id, self.random.random() < 0.5,
+            )
+            prescription_id += 1
+        self.finish('prescriptions', writer)
+
+    def generate_orders(self, appointment_start, appointments, form_start, forms):
+        start = reserve_ids(Order, appointments + forms)
+        writer = self.writer(Order, ['id', 'type', 'appointment_id', 'form_assessment_id', 'created_date'])
+        for index in range(appointments):
+            writer.write(start + index, OrderType.VIDEO_ASSESSMENT, appointment_start + index, None, self.now)
+        for index in range(forms):
+            writer.write(start + appointments + index, OrderType.FORM_ASSESSMENT, None, form_start + index, self.now)
+        self.finish('orders', writer)
+        return start, appointments + forms
+
+    def price_orders(self, start, count):
+        for batch_start in range(start, start + count, PRICING_BATCH_SIZE):
+            batch_end = min(batch_start + PRICING_BATCH_SIZE, start + count)
+            reprice_orders(Order.objects.filter(pk__gte=batch_start, pk__lt=batch_end))
+
+    def generate(self, price_orders=True):
+        """Write the whole graph in one transaction, returns the number of rows written by table."""
+        with transaction.atomic():
+            self.generate_users()
+            self.generate_medicines()
+            availability_start, booked = self.generate_availabilities()
+            appointment_start, appointments = self.generate_appointments(availability_start, booked)
+            form_start, assessed = self.generate_form_assessments()
+            self.generate_prescriptions(appointment_start, appointments, form_start, assessed)
+            order_start, orders = self.generate_orders(appointment_start, appointments, form_start, self.forms)
+            if price_orders:
+                self.price_orders(order_start, orders)
+        return self.counts
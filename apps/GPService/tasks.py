@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from .services import release_expired_reservations
+
+
+@shared_task
+def release_expired_stock_reservations():
+    return release_expired_reservations()
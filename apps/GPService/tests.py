@@ -1,3 +1,492 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.common.tests.utils import get_response_data, assert_max_queries, assert_no_permission, \
+    assert_validation_error
+from apps.common.exceptions import Conflict
+from apps.files.models import File
+from apps.GPService.error_codes import GPServiceErrorCodes
+from apps.GPService.models import Availability, Appointment, Country, FormAssessment, FormAssessmentAnswer, \
+    FormAssessmentQuestion, FormAssessmentType, Medicine, MedicineType, Order, OrderType, Prescription, \
+    RecommendedVaccine, ReservationStatus, StockReservation, Treatment
+from apps.GPService.catalog import medicine_prefix_index, MedicinePrefixIndex
+from apps.GPService.services import confirm_reservation, release_expired_reservations, reserve_stock, \
+    reserve_stock_bulk, reprice_all_orders, get_vaccine_map
+from apps.users.tests.fixtures import ApiClient
+from apps.users.models import User, Roles
+from project import settings as project_settings
+
+
+def test_bulk_create_availabilities(doctor_api_client, doctor_user):
+    start_date = date.today() + timedelta(days=1)
+    Availability.objects.create(
+        doctor=doctor_user,
+        date=start_date,
+        starting_time=time(9, 0),
+        ending_time=time(9, 15)
+    )
+    data = {
+        'start_date': start_date.isoformat(),
+        'end_date': (start_date + timedelta(days=1)).isoformat(),
+        'windows': [
+            {'starting_time': '09:00', 'ending_time': '10:00'},
+            {'starting_time': '14:00', 'ending_time': '14:40'},
+        ],
+        'doctor_charge': 150,
+    }
+    url = reverse('availabilities-bulk-create')
+    response = doctor_api_client.post(url, data, format='json')
+
+    content = get_response_data(response)
+    assert response.status_code == 201
+    assert len(content['data']['created']) == 11
+    assert content['data']['skipped'] == [
+        {'date': start_date.isoformat(), 'starting_time': '09:00:00', 'ending_time': '09:15:00'}
+    ]
+    assert Availability.objects.filter(doctor=doctor_user, doctor_charge=150).count() == 11
+
+
+def test_bulk_create_availabilities_with_invalid_window(doctor_api_client):
+    start_date = date.today() + timedelta(days=1)
+    data = {
+        'start_date': start_date.isoformat(),
+        'end_date': start_date.isoformat(),
+        'windows': [{'starting_time': '10:00', 'ending_time': '09:00'}],
+    }
+    url = reverse('availabilities-bulk-create')
+    response = doctor_api_client.post(url, data, format='json')
+    assert_validation_error(response)
+    assert not Availability.objects.exists()
+
+
+def test_book_availability(patient_api_client, patient_user, doctor_user):
+    availability = Availability.objects.create(
+        doctor=doctor_user,
+        date=date.today() + timedelta(days=1),
+        starting_time=time(9, 0),
+        ending_time=time(9, 15)
+    )
+    url = reverse('availabilities-book', args=[availability.pk])
+    response = patient_api_client.post(url, {}, format='json')
+
+    content = get_response_data(response)
+    assert response.status_code == 201
+    assert content['data']['patient'] == str(patient_user.pk)
+    assert content['data']['availability'] == availability.pk
+    availability.refresh_from_db()
+    assert availability.is_booked
+
+    response = patient_api_client.post(url, {}, format='json')
+    content = get_response_data(response)
+    assert response.status_code == 409
+    assert content['message'] == 'Conflict'
+    assert Appointment.objects.count() == 1
+
+
+def test_book_availability_checks_patient_and_attachment(patient_api_client, doctor_api_client, patient_user,
+                                                         doctor_user):
+    availability = Availability.objects.create(
+        doctor=doctor_user,
+        date=date.today() + timedelta(days=1),
+        starting_time=time(9, 0),
+        ending_time=time(9, 15)
+    )
+    url = reverse('availabilities-book', args=[availability.pk])
+    assert_no_permission(doctor_api_client.post(url, {}, format='json'))
+
+    others_file = File.objects.create(file='letter.pdf', file_name='letter.pdf', uploaded_by=doctor_user)
+    response = patient_api_client.post(url, {'attachment': str(others_file.pk)}, format='json')
+    errors = assert_validation_error(response)
+    assert 'attachment' in errors[0]
+    assert not Appointment.objects.exists()
+
+    own_file = File.objects.create(file='scan.pdf', file_name='scan.pdf', uploaded_by=patient_user)
+    response = patient_api_client.post(url, {'attachment': str(own_file.pk)}, format='json')
+    assert response.status_code == 201
+    assert get_response_data(response)['data']['attachment'] == str(own_file.pk)
+
+
+def test_search_free_slots(patient_api_client, doctor_user, admin_user):
+    day = date.today() + timedelta(days=1)
+    Availability.objects.bulk_create([
+        Availability(doctor=doctor_user, date=day, starting_time=time(9, 30), ending_time=time(9, 45)),
+        Availability(doctor=doctor_user, date=day, starting_time=time(9, 0), ending_time=time(9, 15), is_booked=True),
+        Availability(doctor=admin_user, date=day, starting_time=time(9, 0), ending_time=time(9, 15)),
+        Availability(doctor=admin_user, date=day, starting_time=time(11, 0), ending_time=time(11, 15)),
+        Availability(doctor=doctor_user, date=day, starting_time=time(8, 0), ending_time=time(8, 15), doctor_charge=500),
+    ])
+    url = reverse('availabilities-search')
+    response = patient_api_client.get(url, {'time_from': '08:30', 'max_charge': 200, 'page_size': 2})
+
+    content = get_response_data(response)
+    assert response.status_code == 200
+    assert [slot['starting_time'] for slot in content['data']['results']] == ['09:00:00', '09:30:00']
+    assert content['data']['results'][0]['doctor'] == str(admin_user.pk)
+
+    response = patient_api_client.get(content['data']['next'])
+    content = get_response_data(response)
+    assert [slot['starting_time'] for slot in content['data']['results']] == ['11:00:00']
+    assert content['data']['next'] is None
+
+
+def test_list_availabilities_is_cached_until_changed(doctor_api_client, doctor_user,
+                                                     django_capture_on_commit_callbacks):
+    day = date.today() + timedelta(days=1)
+    Availability.objects.create(doctor=doctor_user, date=day, starting_time=time(9, 0), ending_time=time(9, 15))
+    url = reverse('availabilities-list')
+    params = {'doctor': str(doctor_user.pk), 'date': day.isoformat()}
+
+    content = get_response_data(doctor_api_client.get(url, params))
+    assert len(content['data']['results']) == 1
+
+    # Not written through the API, the cached listing does not know about it
+    Availability.objects.create(doctor=doctor_user, date=day, starting_time=time(9, 15), ending_time=time(9, 30))
+    content = get_response_data(doctor_api_client.get(url, params))
+    assert len(content['data']['results']) == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = doctor_api_client.post(url, {
+            'date': day.isoformat(),
+            'starting_time': '10:00',
+            'ending_time': '10:15',
+        }, format='json')
+    assert response.status_code == 201
+    content = get_response_data(doctor_api_client.get(url, params))
+    assert [slot['starting_time'] for slot in content['data']['results']] == ['09:00:00', '09:15:00', '10:00:00']
+
+
+def test_list_availabilities_query_budget(patient_api_client, doctor_user):
+    day = date.today() + timedelta(days=1)
+    Availability.objects.bulk_create([
+        Availability(doctor=doctor_user, date=day, starting_time=time(hour, minute),
+                     ending_time=(datetime.combine(day, time(hour, minute)) + timedelta(minutes=15)).time())
+        for hour in range(8, 18) for minute in (0, 15, 30, 45)
+    ])
+    with assert_max_queries(3):
+        response = patient_api_client.get(reverse('availabilities-list'), {'date': day.isoformat()})
+    assert len(get_response_data(response)['data']['results']) > 1
+
+
+@pytest.fixture
+def medicines(db):
+    return [
+        Medicine.objects.create(name=name, type=MedicineType.TABLET, available_quantity=quantity, price=5)
+        for name, quantity in [('Paracetamol', 10), ('Ibuprofen', 3)]
+    ]
+
+
+def test_reserve_stock_never_oversells(medicines):
+    paracetamol = medicines[0]
+    reserve_stock(paracetamol.pk, 6)
+    with pytest.raises(Conflict):
+        reserve_stock(paracetamol.pk, 5)
+
+    paracetamol.refresh_from_db()
+    assert paracetamol.available_quantity == 4
+
+
+def test_reserve_stock_bulk_is_all_or_nothing(medicines):
+    paracetamol, ibuprofen = medicines
+    with pytest.raises(Conflict):
+        reserve_stock_bulk([
+            {'medicine_id': paracetamol.pk, 'quantity': 2},
+            {'medicine_id': ibuprofen.pk, 'quantity': 4},
+        ])
+    assert [medicine.available_quantity for medicine in Medicine.objects.order_by('pk')] == [10, 3]
+
+    reservations = reserve_stock_bulk([
+        {'medicine_id': paracetamol.pk, 'quantity': 2},
+        {'medicine_id': ibuprofen.pk, 'quantity': 3},
+        {'medicine_id': paracetamol.pk, 'quantity': 1},
+    ])
+    assert len(reservations) == 3
+    assert [medicine.available_quantity for medicine in Medicine.objects.order_by('pk')] == [7, 0]
+
+
+def test_expired_reservations_give_stock_back(medicines):
+    paracetamol = medicines[0]
+    expired = reserve_stock(paracetamol.pk, 4)
+    confirmed = reserve_stock(paracetamol.pk, 3)
+    StockReservation.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+    confirm_reservation(confirmed.pk)
+
+    assert release_expired_reservations() == 1
+    paracetamol.refresh_from_db()
+    assert paracetamol.available_quantity == 7
+    assert StockReservation.objects.get(pk=expired.pk).status == ReservationStatus.RELEASED
+    with pytest.raises(Conflict):
+        confirm_reservation(expired.pk)
+
+
+def test_search_medicines_by_word_prefixes(patient_api_client, django_capture_on_commit_callbacks, monkeypatch):
+    # Rebuilt in the request, a background thread would not see this test's transaction
+    monkeypatch.setattr(medicine_prefix_index, 'background', False)
+    with django_capture_on_commit_callbacks(execute=True):
+        for name, medicine_type in [('Folic Acid', MedicineType.TABLET), ('Paracetamol Extra', MedicineType.TABLET),
+                                    ('Paracetamol', MedicineType.CAPSULES), ('Hepatitis A', MedicineType.VACCINE)]:
+            Medicine.objects.create(name=name, type=medicine_type, available_quantity=10, price=5)
+
+    content = get_response_data(patient_api_client.get(reverse('medicines-list'), {'q': 'para ext'}))
+    assert [medicine['name'] for medicine in content['data']['results']] == ['Paracetamol Extra']
+
+    url = reverse('medicines-autocomplete')
+    content = get_response_data(patient_api_client.get(url, {'q': 'PARA'}))
+    assert sorted(medicine['name'] for medicine in content['data']) == ['Paracetamol', 'Paracetamol Extra']
+    content = get_response_data(patient_api_client.get(url, {'q': 'para', 'type': MedicineType.CAPSULES}))
+    assert [medicine['name'] for medicine in content['data']] == ['Paracetamol']
+    content = get_response_data(patient_api_client.get(url, {'q': 'vacc'}))
+    assert [medicine['name'] for medicine in content['data']] == ['Hepatitis A']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Medicine.objects.filter(name='Folic Acid').get().delete()
+    assert medicine_prefix_index.search('acid') == []
+
+
+def test_medicine_prefix_index_rebuilds_in_background(transactional_db):
+    Medicine.objects.create(name='Paracetamol', type=MedicineType.TABLET, available_quantity=10, price=5)
+    index = MedicinePrefixIndex()
+    release = threading.Event()
+    build = index.build
+    index.build = lambda version: release.wait(5) and build(version)
+
+    # Answered by the database until the first build is done
+    assert [medicine['name'] for medicine in index.search('para')] == ['Paracetamol']
+    release.set()
+    index.rebuild_thread.join(5)
+    assert index.version is not None
+
+    release.clear()
+    Medicine.objects.create(name='Paramol', type=MedicineType.TABLET, available_quantity=10, price=5)
+    assert [medicine['name'] for medicine in index.search('para')] == ['Paracetamol']
+    release.set()
+    index.rebuild_thread.join(5)
+    assert sorted(medicine['name'] for medicine in index.search('para')) == ['Paracetamol', 'Paramol']
+
+
+def test_order_totals_follow_prescriptions_and_prices(patient_api_client, patient_user, doctor_user, medicines):
+    paracetamol, ibuprofen = medicines
+    availability = Availability.objects.create(
+        doctor=doctor_user, date=date.today() + timedelta(days=1), doctor_charge=100,
+        starting_time=time(9, 0), ending_time=time(9, 15)
+    )
+    appointment = Appointment.objects.create(patient=patient_user, availability=availability)
+    Prescription.objects.create(medicine=paracetamol, prescribed_quantity=2, appointment=appointment, is_accepted=True)
+    order = Order.objects.create(type=OrderType.VIDEO_ASSESSMENT, appointment=appointment, created_date=timezone.now())
+    assert order.total_amount == Decimal('110.00')
+
+    prescription = Prescription.objects.create(medicine=ibuprofen, prescribed_quantity=1, appointment=appointment)
+    order.refresh_from_db()
+    assert order.total_amount == Decimal('110.00')
+    prescription.is_accepted = True
+    prescription.save()
+    paracetamol.price = Decimal('7.50')
+    paracetamol.save()
+    content = get_response_data(patient_api_client.get(reverse('orders-list')))
+    assert [item['total_amount'] for item in content['data']['results']] == ['120.00']
+
+    Order.objects.update(total_amount=None)
+    assert reprice_all_orders(batch_size=1) == 1
+    order.refresh_from_db()
+    assert order.total_amount == Decimal('120.00')
+
+
+def test_medicine_saves_only_reprice_on_price_changes(patient_user, doctor_user, medicines,
+                                                       django_assert_num_queries):
+    availability = Availability.objects.create(
+        doctor=doctor_user, date=date.today() + timedelta(days=1), doctor_charge=100,
+        starting_time=time(9, 0), ending_time=time(9, 15)
+    )
+    appointment = Appointment.objects.create(patient=patient_user, availability=availability)
+    Prescription.objects.create(medicine=medicines[0], prescribed_quantity=2, appointment=appointment, is_accepted=True)
+    order = Order.objects.create(type=OrderType.VIDEO_ASSESSMENT, appointment=appointment, created_date=timezone.now())
+
+    medicine = Medicine.objects.get(pk=medicines[0].pk)
+    medicine.name = 'Paracetamol 500mg'
+    # The medicine's own UPDATE, no orders repriced
+    with django_assert_num_queries(1):
+        medicine.save()
+    medicine.price = Decimal('6.00')
+    with django_assert_num_queries(1):
+        medicine.save(update_fields=['name'])
+
+    medicine.save(update_fields=['price'])
+    order.refresh_from_db()
+    assert order.total_amount == Decimal('112.00')
+
+
+def test_question_set_is_cached_with_etag(shared_cache, patient_api_client, django_assert_num_queries,
+                                          django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        question = FormAssessmentQuestion.objects.create(treatment=Treatment.CANCER, question='Any family history?')
+        FormAssessmentQuestion.objects.create(treatment=Treatment.ALLERGIES, question='Any known allergies?')
+    url = reverse('questions-detail', args=[Treatment.CANCER])
+
+    response = patient_api_client.get(url)
+    content = get_response_data(response)
+    assert [item['question'] for item in content['data']] == ['Any family history?']
+    etag = response['ETag']
+
+    with django_assert_num_queries(0):
+        assert patient_api_client.get(url).status_code == 200
+        assert patient_api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        question.question = 'Any family history of cancer?'
+        question.save()
+    response = patient_api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert get_response_data(response)['data'][0]['question'] == 'Any family history of cancer?'
+
+
+def test_question_set_expires_without_version_bump(patient_api_client, monkeypatch):
+    # A per-process cache backend never shows other processes' version bumps, the TTL bounds staleness
+    question = FormAssessmentQuestion.objects.create(treatment=Treatment.CANCER, question='Any family history?')
+    url = reverse('questions-detail', args=[Treatment.CANCER])
+    etag = patient_api_client.get(url)['ETag']
+
+    FormAssessmentQuestion.objects.filter(pk=question.pk).update(question='Any family history of cancer?')
+    assert patient_api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    monkeypatch.setattr(project_settings, 'PROCESS_CACHE_TTL', 0)
+    response = patient_api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert get_response_data(response)['data'][0]['question'] == 'Any family history of cancer?'
+
+
+def test_recommended_vaccines_are_prefetched_and_cached(shared_cache, patient_api_client, django_assert_num_queries,
+                                                        django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        for index in range(3):
+            country = Country.objects.create(name='Country {}'.format(index))
+            for vaccine in range(2):
+                medicine = Medicine.objects.create(
+                    name='Vaccine {}-{}'.format(index, vaccine), type=MedicineType.VACCINE,
+                    available_quantity=10, price=Decimal('20.00')
+                )
+                RecommendedVaccine.objects.create(country=country, medicine=medicine, posted_date=timezone.now())
+    url = reverse('vaccines-list')
+
+    with django_assert_num_queries(2):
+        get_vaccine_map()
+    response = patient_api_client.get(url)
+    content = get_response_data(response)
+    assert [country['name'] for country in content['data']] == ['Country 0', 'Country 1', 'Country 2']
+    assert len(content['data'][0]['recommended_vaccines']) == 2
+    etag = response['ETag']
+
+    with django_assert_num_queries(0):
+        assert patient_api_client.get(url).status_code == 200
+        assert patient_api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        response = patient_api_client.get(reverse('vaccines-detail', args=[country.id]))
+        assert get_response_data(response)['data']['name'] == 'Country 2'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        medicine.name = 'Yellow fever vaccine'
+        medicine.save()
+    response = patient_api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert get_response_data(response)['data'][2]['recommended_vaccines'][1]['medicine']['name'] == \
+        'Yellow fever vaccine'
+
+
+def test_submit_form_assessment_in_constant_queries(shared_cache, patient_api_client, doctor_api_client, patient_user):
+    questions = FormAssessmentQuestion.objects.bulk_create([
+        FormAssessmentQuestion(treatment=Treatment.ALLERGIES, question='Question {}'.format(i)) for i in range(50)
+    ])
+    url = reverse('form-assessments-list')
+
+    def submit(count):
+        with CaptureQueriesContext(connection) as queries:
+            response = patient_api_client.post(url, {
+                'type': FormAssessmentType.ONE_TIME_FORM,
+                'treatment': Treatment.ALLERGIES,
+                'answers': [{'question': question.pk, 'answer': 'No'} for question in questions[:count]],
+            }, format='json')
+        assert response.status_code == 201
+        return get_response_data(response)['data'], len(queries)
+
+    submit(1)
+    data, five_question_queries = submit(5)
+    assert len(data['answers']) == 5
+    data, fifty_question_queries = submit(50)
+    assert data['patient'] == str(patient_user.pk)
+    assert len(data['answers']) == FormAssessmentAnswer.objects.filter(form_assessment=data['id']).count() == 50
+    assert fifty_question_queries == five_question_queries <= 5
+
+    response = patient_api_client.post(url, {
+        'type': FormAssessmentType.ONE_TIME_FORM,
+        'treatment': Treatment.ALLERGIES,
+        'answers': [{'question': questions[0].pk, 'answer': 'No'}, {'question': 10 ** 6, 'answer': 'No'}],
+    }, format='json')
+    assert response.status_code == 400
+
+    submission = {
+        'type': FormAssessmentType.ONE_TIME_FORM,
+        'treatment': Treatment.CANCER,
+        'answers': [{'question': questions[0].pk, 'answer': 'No'}],
+    }
+    response = patient_api_client.post(url, submission, format='json')
+    assert assert_validation_error(response) == [{'answers': [GPServiceErrorCodes.QUESTIONS_OF_OTHER_TREATMENT]}]
+    submission['treatment'] = Treatment.ALLERGIES
+    assert doctor_api_client.post(url, submission, format='json').status_code == 403
+
+
+def test_doctors_lease_distinct_form_assessments(doctor_api_client, doctor_user, patient_user):
+    other_doctor = User.objects.create_user(email='doctor2@example.com', username='doctor2@example.com',
+                                            password='password', role=Roles.DOCTOR)
+    other_client = ApiClient(user=other_doctor)
+    assessments = [FormAssessment.objects.create(patient=patient_user, type=FormAssessmentType.ONE_TIME_FORM)
+                   for _ in range(3)]
+    url = reverse('form-assessments-lease')
+
+    content = get_response_data(doctor_api_client.post(url, {'count': 2}, format='json'))
+    assert [item['id'] for item in content['data']] == [assessments[0].pk, assessments[1].pk]
+    content = get_response_data(other_client.post(url, {'count': 2}, format='json'))
+    assert [item['id'] for item in content['data']] == [assessments[2].pk]
+
+    complete_url = reverse('form-assessments-complete', args=[assessments[0].pk])
+    assert other_client.post(complete_url, {}, format='json').status_code == 409
+    response = doctor_api_client.post(complete_url, {'feedback': 'Looks fine'}, format='json')
+    assert response.status_code == 200
+    assessments[0].refresh_from_db()
+    assert assessments[0].is_assessed and assessments[0].doctor == doctor_user and assessments[0].assessed_date
+    assert assessments[0].leased_by is None
+
+    FormAssessment.objects.filter(pk=assessments[1].pk).update(lease_expires_at=timezone.now())
+    content = get_response_data(other_client.post(url, {'count': 5}, format='json'))
+    assert [item['id'] for item in content['data']] == [assessments[1].pk, assessments[2].pk]
+
+    invalid_url = complete_url.replace(str(assessments[0].pk), 'abc')
+    assert doctor_api_client.post(invalid_url, {}, format='json').status_code == 404
+    missing_url = reverse('form-assessments-complete', args=[10 ** 6])
+    assert doctor_api_client.post(missing_url, {}, format='json').status_code == 404
+
+
+def test_generate_synthetic_data_keeps_foreign_keys_consistent(db):
+    call_command(
+        'generate_synthetic_data', '--doctors=3', '--patients=20', '--slots-per-doctor=40', '--booking-rate=0.5',
+        '--medicines=5', stdout=io.StringIO()
+    )
+
+    booked = Availability.objects.filter(is_booked=True)
+    assert Availability.objects.count() == 120
+    assert Appointment.objects.count() == booked.count() > 0
+    assert set(Appointment.objects.values_list('availability_id', flat=True)) == \
+        set(booked.values_list('id', flat=True))
+    assert Order.objects.count() == Appointment.objects.count() + FormAssessment.objects.count()
+    assert not Order.objects.filter(total_amount__isnull=True).exists()
+    assert Prescription.objects.filter(form_assessment__is_assessed=False).count() == 0
+
+    patient = User.objects.get(email='patient0.0@example.com')
+    assert patient.role == Roles.PATIENT
+    assert patient.check_password('password')
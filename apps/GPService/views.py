@@ -1,15 +1,80 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import AvailabilitySerializer
-from .models import Availability
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from django.core.cache import cache
+from django.db.models import Q
+from .serializers import AvailabilitySerializer, AvailabilityBulkCreateSerializer, AvailabilitySlotSerializer, \
+    AppointmentSerializer, AppointmentBookingSerializer, AvailabilitySearchSerializer, FreeSlotSerializer, \
+    AvailabilityFilterSerializer, MedicineSerializer, MedicineSearchSerializer, MedicineAutocompleteSerializer, \
+    OrderSerializer, FormAssessmentSerializer, FormAssessmentAnswerSerializer, FormAssessmentSubmissionSerializer, \
+    FormAssessmentReviewSerializer, FormAssessmentLeaseSerializer, FormAssessmentCompleteSerializer
+from .catalog import medicine_prefix_index
+from .models import Availability, FormAssessment, Medicine, Order, Treatment
+from .services import generate_availability_slots, book_availability, search_free_slots, \
+    get_availability_list_cache_key, invalidate_availability_cache, search_medicines, get_question_set, \
+    submit_form_assessment, lease_form_assessments, complete_form_assessment, get_vaccine_map
 from datetime import datetime
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
+from apps.common.etags import get_revalidated_response
+from apps.users.permissions import IsDoctor, IsPatient
+from apps.common.pagination import KeysetPagination
 from apps.common.services import is_the_appointment_slot_exactly_15_minutes
+from project import settings
+
+
+class AvailabilityPagination(KeysetPagination):
+    ordering = ('date', 'starting_time', 'id')
+
+
+class MedicinePagination(KeysetPagination):
+    ordering = ('name', 'id')
+
 
 class AvailabilityViewSet(viewsets.ModelViewSet):
     queryset = Availability.objects.all()
     serializer_class = AvailabilitySerializer
+    pagination_class = AvailabilityPagination
+    filters = {}
+
+
+    def get_permissions(self):
+        if self.action == 'book':
+            permission_classes = [IsAuthenticated, IsPatient]
+        else:
+            permission_classes = [IsAuthenticated]
+        return [permission() for permission in permission_classes]
+
+
+    def list(self, request, *args, **kwargs):
+        serializer = AvailabilityFilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        self.filters = serializer.validated_data
+
+        # Listings of a day, optionally of a single doctor, are cached until an availability of that day changes
+        cache_key = None
+        if 'date' in self.filters:
+            cache_key = get_availability_list_cache_key(
+                self.filters.get('doctor'),
+                self.filters['date'],
+                request.query_params.urlencode()
+            )
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if cache_key:
+            cache.set(cache_key, response.data, settings.AVAILABILITY_LIST_CACHE_TIMEOUT)
+        return response
+
+    def filter_queryset(self, queryset):
+        if 'doctor' in self.filters:
+            queryset = queryset.filter(doctor_id=self.filters['doctor'])
+        if 'date' in self.filters:
+            queryset = queryset.filter(date=self.filters['date'])
+        return queryset
 
 
     def perform_create(self, serializer):
@@ -24,7 +89,8 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
             serializer.validated_data['ending_time']):
             raise ValidationError("The duration of the availability slot should exactly be 15 minutes")
         else:
-            serializer.save(doctor=self.request.user)
+            availability = serializer.save(doctor=self.request.user)
+            invalidate_availability_cache([(availability.doctor_id, availability.date)])
 
 
     def perform_update(self, serializer):
@@ -43,6 +109,10 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
             raise ValidationError("The duration of the availability slot should exactly be 15 minutes")
         else:
             super().perform_update(serializer)
+            invalidate_availability_cache([
+                (availability.doctor_id, availability.date),
+                (serializer.instance.doctor_id, serializer.instance.date),
+            ])
 
 
     def perform_destroy(self, instance):
@@ -53,3 +123,139 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
             raise ValidationError("This availability instance cannot be deleted as it has been associated with an appointment")
         else:
             super().perform_destroy(instance)
+            invalidate_availability_cache([(availability.doctor_id, availability.date)])
+
+
+    @action(methods=['post'], detail=False, url_path='bulk')
+    def bulk_create(self, request):
+        serializer = AvailabilityBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created, skipped = generate_availability_slots(request.user, **serializer.validated_data)
+        return Response({
+            'created': AvailabilitySerializer(created, many=True).data,
+            'skipped': AvailabilitySlotSerializer(skipped, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+
+    @action(methods=['post'], detail=True)
+    def book(self, request, pk=None):
+        availability = self.get_object()
+        serializer = AppointmentBookingSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        appointment = book_availability(availability.pk, request.user, **serializer.validated_data)
+        return Response(AppointmentSerializer(appointment).data, status=status.HTTP_201_CREATED)
+
+
+    @action(methods=['get'], detail=False)
+    def search(self, request):
+        serializer = AvailabilitySearchSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        page = self.paginate_queryset(search_free_slots(**serializer.validated_data))
+        return self.get_paginated_response(FreeSlotSerializer(page, many=True).data)
+
+
+class MedicineViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Medicine.objects.all()
+    serializer_class = MedicineSerializer
+    pagination_class = MedicinePagination
+
+    def filter_queryset(self, queryset):
+        if self.action != 'list':
+            return queryset
+        serializer = MedicineSearchSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return search_medicines(serializer.validated_data.get('q'), serializer.validated_data.get('type'))
+
+
+    @action(methods=['get'], detail=False)
+    def autocomplete(self, request):
+        serializer = MedicineAutocompleteSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(medicine_prefix_index.search(
+            serializer.validated_data['q'],
+            serializer.validated_data.get('type'),
+            serializer.validated_data['limit']
+        ))
+
+
+class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        # Totals are stored on the order by the pricing engine, listing never computes them
+        user = self.request.user
+        if user.is_admin_user():
+            return Order.objects.all()
+        return Order.objects.filter(
+            Q(appointment__patient=user) | Q(form_assessment__patient=user)
+            | Q(appointment__availability__doctor=user) | Q(form_assessment__doctor=user)
+        )
+
+
+class FormAssessmentQuestionViewSet(viewsets.ViewSet):
+    lookup_value_regex = '[A-Z_]+'
+
+    def retrieve(self, request, pk=None):
+        """Questions of a treatment, clients revalidate with If-None-Match and get a 304 while nothing changed."""
+        if pk not in Treatment.values:
+            raise NotFound()
+
+        etag, questions = get_question_set(pk)
+        return get_revalidated_response(request, etag, questions)
+
+
+class RecommendedVaccineViewSet(viewsets.ViewSet):
+    lookup_value_regex = '[0-9]+'
+
+    def list(self, request):
+        """Recommended vaccines of every country, served from memory and revalidated with If-None-Match."""
+        etag, countries = get_vaccine_map()
+        return get_revalidated_response(request, etag, list(countries.values()))
+
+    def retrieve(self, request, pk=None):
+        etag, countries = get_vaccine_map()
+        country = countries.get(int(pk))
+        if country is None:
+            raise NotFound()
+        return get_revalidated_response(request, etag, country)
+
+
+class FormAssessmentViewSet(viewsets.GenericViewSet):
+    queryset = FormAssessment.objects.all()
+    serializer_class = FormAssessmentSubmissionSerializer
+    lookup_value_regex = '[0-9]+'
+
+    def get_permissions(self):
+        if self.action in ['lease', 'complete']:
+            permission_classes = [IsAuthenticated, IsDoctor]
+        elif self.action == 'create':
+            permission_classes = [IsAuthenticated, IsPatient]
+        else:
+            permission_classes = [IsAuthenticated]
+        return [permission() for permission in permission_classes]
+
+    def create(self, request):
+        """Submit a whole questionnaire, the assessment and its answers are created at once."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assessment, answers = submit_form_assessment(request.user, **serializer.validated_data)
+        data = FormAssessmentSerializer(assessment).data
+        data['answers'] = FormAssessmentAnswerSerializer(answers, many=True).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(methods=['post'], detail=False)
+    def lease(self, request):
+        """Take the next pending forms off the work queue, they stay reserved to the doctor until the lease expires."""
+        serializer = FormAssessmentLeaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assessments = lease_form_assessments(request.user, serializer.validated_data['count'])
+        assessments = assessments.prefetch_related('form_assessment_answers')
+        return Response(FormAssessmentReviewSerializer(assessments, many=True).data)
+
+    @action(methods=['post'], detail=True)
+    def complete(self, request, pk=None):
+        serializer = FormAssessmentCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assessment = complete_form_assessment(pk, request.user, serializer.validated_data.get('feedback'))
+        return Response(FormAssessmentSerializer(assessment).data)
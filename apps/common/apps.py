@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
     name = 'apps.common'
+
+    def ready(self):
+        from celery.signals import task_postrun, task_prerun, worker_process_init
+
+        from apps.common import metrics
+        from apps.common.email_templates import warm_email_templates
+        worker_process_init.connect(lambda **kwargs: warm_email_templates(), weak=False)
+        task_prerun.connect(metrics.task_prerun)
+        task_postrun.connect(metrics.task_postrun)
@@ -0,0 +1,52 @@
+import hashlib
+import json
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def get_cache_version(key):
+    """Return the current version of a group of cache entries.
+
+    Entries are cached under keys that include the version, bumping the version invalidates all of them
+    at once. A missing version (never set or evicted) is replaced by a new one, so stale entries are never
+    served again.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(key):
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+class ProcessCache:
+    """Values kept in process memory, reloaded when the version under `version_key` is bumped.
+
+    With a per-process cache backend (e.g. LocMemCache) other processes never see the bump, values are
+    then also reloaded once they are `timeout` seconds old. Every value comes with an ETag derived from
+    its content, so all processes agree on it.
+    """
+
+    def __init__(self, version_key):
+        self.version_key = version_key
+        self.values = {}
+
+    def get(self, key, load, timeout):
+        """Return the ETag and value of `key`, calling `load()` when it is missing, outdated or expired."""
+        version = get_cache_version(self.version_key)
+        cached = self.values.get(key)
+        if cached is None or cached[0] != version or time.monotonic() - cached[1] >= timeout:
+            value = load()
+            content = json.dumps(value, sort_keys=True, cls=DjangoJSONEncoder).encode('utf-8')
+            cached = self.values[key] = (version, time.monotonic(), hashlib.md5(content).hexdigest(), value)
+        return cached[2], cached[3]
+
+    def invalidate(self):
+        bump_cache_version(self.version_key)
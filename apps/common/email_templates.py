@@ -1,4 +1,13 @@
+import functools
+import logging
+
 from django.db.models import TextChoices
+from django.template import Context, engines, Engine, TemplateDoesNotExist
+
+logger = logging.getLogger('apps.common.email_templates')
+
+TEMPLATE_EXTENSIONS = ['.txt', '.html']
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
 
 
 class EmailTemplates(TextChoices):
@@ -8,4 +17,44 @@ class EmailTemplates(TextChoices):
     AUTH_PASSWORD_RESET_REQUEST = "auth/request-reset-password{}"
     AUTH_VERIFY_AND_JOIN_PROJECT = "auth/verify-and-join-project{}"
 
-    PROJECTS_USER_INVITATION = "projects/verify-and-join-project{}"
+
+@functools.lru_cache(maxsize=None)
+def get_email_engine():
+    """Template engine for emails, configured like the project's but always caching compiled templates.
+
+    The project's engine only caches them when DEBUG is off, emails are not edited at runtime so they are cached
+    regardless. Templates they extend (e.g. `base.html`) are cached as well.
+    """
+    engine = engines['django'].engine
+    loaders = engine.loaders
+    if not any(isinstance(loader, tuple) and loader[0] == CACHED_LOADER for loader in loaders):
+        loaders = [(CACHED_LOADER, loaders)]
+    return Engine(
+        dirs=engine.dirs,
+        loaders=loaders,
+        string_if_invalid=engine.string_if_invalid,
+        file_charset=engine.file_charset,
+        libraries=engine.libraries,
+        # Engine adds the default builtins itself, only the configured ones are passed on
+        builtins=[builtin for builtin in engine.builtins if builtin not in Engine.default_builtins],
+        autoescape=engine.autoescape,
+    )
+
+
+def render_email_template(template_name, context):
+    return get_email_engine().get_template(template_name).render(Context(context))
+
+
+def warm_email_templates():
+    """Compile every email template into the cache, called when a web or Celery worker process starts.
+
+    Management commands, migrations and beat never render emails and skip it.
+    """
+    engine = get_email_engine()
+    for template in EmailTemplates:
+        for extension in TEMPLATE_EXTENSIONS:
+            try:
+                # Rendering once also loads the templates it extends or includes
+                engine.get_template(template.value.format(extension)).render(Context({'data': {}}))
+            except TemplateDoesNotExist as e:
+                logger.warning('Email template %s does not exist', e)
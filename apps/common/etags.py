@@ -0,0 +1,20 @@
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+
+def etag_matches(if_none_match, etag):
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+
+def get_revalidated_response(request, etag, data):
+    """Response with `data`, or a 304 when the client already holds `etag`. Clients revalidate every time."""
+    if etag_matches(request.META.get('HTTP_IF_NONE_MATCH', ''), etag):
+        response = HttpResponseNotModified()
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -12,3 +12,9 @@ class ServiceUnavailable(APIException):
     status_code = status.HTTP_503_SERVICE_UNAVAILABLE
     default_detail = 'Service temporarily unavailable, try again later.'
     default_code = 'service_unavailable'
+
+
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Request conflicts with the current state of the resource.'
+    default_code = 'conflict'
@@ -0,0 +1,108 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('apps.common.mail')
+
+
+class EmailBatcher:
+    """Collects emails and hands them to `deliver` in batches from background threads.
+
+    A batch is delivered once it holds `max_size` emails or its oldest email has waited `max_age` seconds.
+    `deliver` returns the emails it could not send, those (or the whole batch when it raises) are retried
+    `retries` times with an exponential backoff starting at `backoff` seconds. `add` blocks while
+    `max_pending` emails are waiting. Pending emails are delivered when the process exits.
+    """
+
+    def __init__(self, deliver, max_size, max_age, max_pending=None, workers=1, retries=0, backoff=1):
+        self.deliver = deliver
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.pid = None
+        atexit.register(self.flush)
+
+    def _reset(self):
+        # Called lazily in every process, threads and locks do not survive a fork
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        self.pending = []
+        self.oldest = None
+        self.in_flight = 0
+        for index in range(self.workers):
+            threading.Thread(target=self._run, name='email-delivery-{}'.format(index), daemon=True).start()
+
+    def add(self, email):
+        if self.pid != os.getpid():
+            self._reset()
+
+        with self.condition:
+            while self.max_pending and len(self.pending) >= self.max_pending:
+                self.condition.wait()
+            if not self.pending:
+                self.oldest = time.monotonic()
+            self.pending.append(email)
+            if len(self.pending) == 1 or len(self.pending) >= self.max_size:
+                self.condition.notify_all()
+
+    def _take(self):
+        batch = self.pending[:self.max_size]
+        del self.pending[:self.max_size]
+        self.oldest = time.monotonic() if self.pending else None
+        self.in_flight += 1
+        self.condition.notify_all()
+        return batch
+
+    def _deliver(self, batch):
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                try:
+                    batch = self.deliver(batch) or []
+                except Exception:
+                    logger.exception('Could not deliver a batch of %s emails', len(batch))
+                if not batch:
+                    return
+            logger.error('Gave up delivering %s emails after %s attempts', len(batch), self.retries + 1)
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                while self.pending and len(self.pending) < self.max_size:
+                    remaining = self.oldest + self.max_age - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if not self.pending:
+                    continue
+                batch = self._take()
+            self._deliver(batch)
+
+    def flush(self):
+        """Deliver every pending email now and wait for batches already being delivered.
+
+        Runs when the process exits.
+        """
+        if self.pid != os.getpid():
+            return
+
+        while True:
+            with self.condition:
+                if not self.pending:
+                    while self.in_flight:
+                        self.condition.wait()
+                    return
+                batch = self._take()
+            self._deliver(batch)
@@ -0,0 +1,143 @@
+import contextvars
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, ExitStack, nullcontext
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY
+from prometheus_client.multiprocess import MultiProcessCollector
+
+PHASES = ['auth', 'db', 'serializer', 'render']
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Duration of API requests', ['view', 'action', 'method', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_PHASE_DURATION = Histogram(
+    'http_request_phase_duration_seconds',
+    'Duration of API requests by phase, serializer is the time left once auth, db and render are taken out',
+    ['view', 'action', 'phase'], buckets=LATENCY_BUCKETS,
+)
+API_EXCEPTIONS = Counter('api_exceptions', 'Exceptions turned into API errors', ['view', 'action', 'exception'])
+EMAILS = Counter('emails', 'Emails handed to the email backend', ['status'])
+TASK_DURATION = Histogram(
+    'celery_task_duration_seconds', 'Duration of Celery tasks', ['task', 'state'], buckets=LATENCY_BUCKETS,
+)
+
+# Phases of the request being handled, None outside of MetricsMiddleware
+current_timings = contextvars.ContextVar('current_timings', default=None)
+task_started = {}
+# Phase histograms of every view and action, looking labels up costs more than observing
+phase_histograms = {}
+
+
+class RequestTimings:
+    def __init__(self):
+        self.view = 'unmatched'
+        self.action = ''
+        self.durations = defaultdict(float)
+        self.active = set()
+
+    @contextmanager
+    def phase(self, name):
+        # Nested measures of the same phase (e.g. renderers calling their parent) are counted once
+        if name in self.active:
+            yield
+            return
+        self.active.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - start
+            self.active.discard(name)
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper, queries run while authenticating are part of the auth phase
+        if 'auth' in self.active:
+            return execute(sql, params, many, context)
+        with self.phase('db'):
+            return execute(sql, params, many, context)
+
+
+def record_phase(name):
+    timings = current_timings.get()
+    return timings.phase(name) if timings is not None else nullcontext()
+
+
+def record_exception(exc):
+    timings = current_timings.get()
+    if timings is not None:
+        API_EXCEPTIONS.labels(timings.view, timings.action, type(exc).__name__).inc()
+
+
+class MetricsMiddleware:
+    """Record the latency of every request, by view and action and split into phases.
+
+    The auth phase is measured by `CachedJWTAuthentication`, render by the JSON renderers and db by a
+    database execute wrapper.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        duration = time.perf_counter() - start
+
+        REQUEST_DURATION.labels(timings.view, timings.action, request.method, response.status_code).observe(duration)
+        durations = timings.durations
+        durations['serializer'] = max(duration - durations['auth'] - durations['db'] - durations['render'], 0)
+        histograms = phase_histograms.get((timings.view, timings.action))
+        if histograms is None:
+            histograms = phase_histograms[timings.view, timings.action] = [
+                (phase, REQUEST_PHASE_DURATION.labels(timings.view, timings.action, phase)) for phase in PHASES
+            ]
+        for phase, histogram in histograms:
+            histogram.observe(durations[phase])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = current_timings.get()
+        view = getattr(view_func, 'cls', None)
+        timings.view = view.__name__ if view else view_func.__name__
+        actions = getattr(view_func, 'actions', None) or {}
+        timings.action = actions.get(request.method.lower(), request.method.lower())
+
+
+def get_registry():
+    """Registry of the metrics to expose.
+
+    When PROMETHEUS_MULTIPROC_DIR is set every gunicorn and Celery worker process writes its samples there,
+    they are added up so the metrics cover all processes rather than the one answering the scrape.
+    """
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+def task_prerun(task_id=None, **kwargs):
+    task_started[task_id] = time.perf_counter()
+
+
+def task_postrun(task_id=None, task=None, state=None, **kwargs):
+    start = task_started.pop(task_id, None)
+    if start is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - start)
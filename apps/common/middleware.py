@@ -0,0 +1,75 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('apps.common.middleware')
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST_RE = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def get_query_shape(sql):
+    """SQL with its literals and placeholder lists collapsed, queries differing only by their values match."""
+    return PLACEHOLDER_LIST_RE.sub('(%s, ...)', LITERAL_RE.sub('%s', sql))
+
+
+class QueryRecorder:
+    """Database execute wrapper counting queries, their total duration and how often each query shape runs."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[get_query_shape(sql)] += 1
+
+    def get_duplicates(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryCountMiddleware:
+    """Count the queries of every request and flag query shapes repeated in a loop (N+1 queries).
+
+    With QUERY_COUNT_HEADERS (off by default) the figures are returned in `X-Query-Count`, `X-Query-Duration`
+    (milliseconds) and `X-Duplicate-Queries` headers. Requests running more than QUERY_COUNT_WARNING_THRESHOLD
+    queries or the same shape QUERY_COUNT_DUPLICATE_THRESHOLD times are logged as warnings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        duplicates = recorder.get_duplicates(settings.QUERY_COUNT_DUPLICATE_THRESHOLD)
+        if settings.QUERY_COUNT_HEADERS:
+            response['X-Query-Count'] = recorder.count
+            response['X-Query-Duration'] = '{:.2f}'.format(recorder.duration * 1000)
+            response['X-Duplicate-Queries'] = sum(count for _, count in duplicates)
+
+        if duplicates or recorder.count > settings.QUERY_COUNT_WARNING_THRESHOLD:
+            logger.warning(
+                '%s %s ran %s queries in %.2fms%s', request.method, request.path, recorder.count,
+                recorder.duration * 1000,
+                ''.join('\n  {} x {}'.format(count, shape) for shape, count in duplicates),
+            )
+        else:
+            logger.debug('%s %s ran %s queries in %.2fms', request.method, request.path, recorder.count,
+                         recorder.duration * 1000)
+        return response
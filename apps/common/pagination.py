@@ -0,0 +1,91 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Seek pagination over a unique ascending ordering.
+
+    The cursor holds the ordering values of the last row of the page, the next page is fetched
+    with `WHERE (ordering) > (cursor)` so its cost does not grow with the page number.
+    The last field of `ordering` must be unique (usually the primary key), and an index over
+    `ordering` lets the database seek to the cursor.
+    """
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset_filter(position))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset.order_by(*self.ordering)[:page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.next_position = [getattr(results[-1], field) for field in self.ordering] if self.has_next else None
+        return results
+
+    def get_keyset_filter(self, position):
+        keyset_filter = Q()
+        for index, field in enumerate(self.ordering):
+            condition = Q(**{'{}__gt'.format(field): position[index]})
+            for previous_field, value in zip(self.ordering[:index], position[:index]):
+                condition &= Q(**{previous_field: value})
+            keyset_filter |= condition
+        # Redundant with the expansion above, but a plain bound on the leading column is what lets the
+        # planner start an index range scan at the cursor instead of filtering the whole index
+        return Q(**{'{}__gte'.format(self.ordering[0]): position[0]}) & keyset_filter
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        encoded = urlsafe_b64encode(json.dumps(position, cls=DjangoJSONEncoder).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -2,7 +2,16 @@ from django.conf import settings
 from random import randint
 from datetime import datetime
 
-from apps.common.tasks import send_email
+from apps.common.mail import EmailBatcher
+from apps.common import tasks
+from apps.common.tasks import send_email, send_email_batch
+
+# Only used without Celery, emails queued in memory are lost if the process dies before they are sent
+email_batcher = EmailBatcher(
+    send_email_batch, settings.EMAIL_BATCH_SIZE, settings.EMAIL_BATCH_MAX_AGE,
+    max_pending=settings.EMAIL_QUEUE_SIZE, workers=settings.EMAIL_DELIVERY_WORKERS,
+    retries=settings.EMAIL_DELIVERY_RETRIES, backoff=settings.EMAIL_DELIVERY_BACKOFF
+)
 
 
 def generate_token(token_length):
@@ -12,10 +21,16 @@ def generate_token(token_length):
 
 
 def send_mail(subject, to, template=None, data=None, message=None):
+    # With Celery every email is handed to the broker right away so nothing is held by the web process
     if settings.ENABLE_CELERY:
         send_email.delay(subject, to, template, data, message)
+    elif settings.ENABLE_ZAPPA:
+        # Lambda freezes the process once the response is returned, background threads cannot be used
+        tasks.send_email_async(subject, to, template, data, message)
+    elif settings.EMAIL_SEND_IN_BACKGROUND:
+        email_batcher.add({'subject': subject, 'to': to, 'template': template, 'data': data, 'message': message})
     else:
-        send_email(subject, to, template, data, message)
+        tasks.deliver_email(subject, to, template, data, message)
 
 def is_the_appointment_slot_exactly_15_minutes(time1, time2):
     start_time = datetime.strptime(time1.isoformat(), "%H:%M:%S")
@@ -1,20 +1,29 @@
+import logging
+import smtplib
+import threading
 
 from celery import shared_task
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.management import call_command
 
-# Add template extensions
-from django.template.loader import render_to_string
+from apps.common.email_templates import render_email_template
+from apps.common.metrics import EMAILS
+
+logger = logging.getLogger('apps.common.tasks')
+
+# SMTP connection of each Celery worker thread, opened by its first email and kept for the next ones
+worker_connections = threading.local()
 
+# Add template extensions
 HTML = '.html'
 TEXT = '.txt'
 
 
 def format_email(template=None, data=None, message=None):
     if template:
-        txt = render_to_string(template.format(TEXT), {'data': data, })
-        html = render_to_string(template.format(HTML), {'data': data, })
+        txt = render_email_template(template.format(TEXT), {'data': data, })
+        html = render_email_template(template.format(HTML), {'data': data, })
         return txt, html
     elif message:
         return message, ''
@@ -27,11 +36,72 @@ def process_notifications():
     call_command('process_notifications')
 
 
-@shared_task
-def send_email(subject, to, template=None, data=None, message=None):
+def build_email(subject, to, template=None, data=None, message=None):
     message, html_message = format_email(template, data, message)
 
     message = EmailMultiAlternatives(subject, message, settings.EMAIL_FROM_ADDRESS, [to])
     if template:
         message.attach_alternative(html_message, "text/html")
-    message.send()
+    return message
+
+
+def deliver_email(subject, to, template=None, data=None, message=None, connection=None):
+    """Send an email, over `connection` when given (it must be open) or a connection of its own."""
+    email = build_email(subject, to, template, data, message)
+    email.connection = connection
+    try:
+        try:
+            email.send()
+        except smtplib.SMTPServerDisconnected:
+            if connection is None:
+                raise
+            # Kept open between emails, the server may have closed it meanwhile
+            connection.close()
+            connection.open()
+            email.send()
+    except Exception:
+        EMAILS.labels('failed').inc()
+        raise
+    EMAILS.labels('sent').inc()
+
+
+def get_worker_connection():
+    connection = getattr(worker_connections, 'connection', None)
+    if connection is None:
+        connection = worker_connections.connection = get_connection()
+        connection.open()
+    return connection
+
+
+@shared_task(autoretry_for=(smtplib.SMTPException, OSError), retry_backoff=True,
+             max_retries=settings.EMAIL_DELIVERY_RETRIES)
+def send_email(subject, to, template=None, data=None, message=None):
+    """Send one queued email. Emails are batched over the worker's SMTP connection rather than held in
+    memory, so each one is acknowledged only once it is sent."""
+    deliver_email(subject, to, template, data, message, connection=get_worker_connection())
+
+
+if settings.ENABLE_ZAPPA:
+    from zappa.asynchronous import task as zappa_task
+
+    # Runs in a separate asynchronous Lambda invocation, the SMTP round trips stay off the request
+    send_email_async = zappa_task(deliver_email)
+
+
+def send_email_batch(emails):
+    """Send emails, given as `send_email` keyword arguments, over a single connection.
+
+    Returns the emails that could not be sent.
+    """
+    failed = []
+    with get_connection() as connection:
+        for email in emails:
+            try:
+                connection.send_messages([build_email(**email)])
+            except Exception:
+                # Only this email is retried, the ones already sent are not sent again
+                logger.exception('Could not send an email to %s', email.get('to'))
+                failed.append(email)
+    EMAILS.labels('sent').inc(len(emails) - len(failed))
+    EMAILS.labels('failed').inc(len(failed))
+    return failed
@@ -1,3 +1,252 @@
-from django.test import TestCase
+import json
+import smtplib
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, date, time
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from django.utils.translation import gettext_lazy as _
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from django.template.loader import render_to_string
+
+from apps.common import services, tasks
+from apps.common.email_templates import EmailTemplates, get_email_engine, render_email_template, \
+    warm_email_templates
+from apps.common.mail import EmailBatcher
+from apps.common.middleware import get_query_shape, QueryCountMiddleware
+from apps.common.pagination import KeysetPagination
+from apps.users.models import User
+from project.renderer import CustomJSONRenderer, FastJSONRenderer
+
+
+@pytest.mark.parametrize('data, status_code', [
+    (None, 200),
+    (None, 204),
+    ([], 200),
+    ({'message': 'Created', 'id': 1}, 201),
+    ({'message': 'ValidationError', 'errors': [{'email': [_('Enter a valid email address.')]}]}, 400),
+    ('Password reset link has been sent to the registered email address.', 200),
+    ([OrderedDict([
+        ('id', uuid.UUID('0b6d4c30-3a6c-4a8e-9b9e-1c2d3e4f5a6b')),
+        ('created', datetime(2022, 11, 1, 6, 52, tzinfo=timezone.utc)),
+        ('date', date(2022, 11, 1)),
+        ('starting_time', time(9, 15)),
+        ('price', Decimal('12.50')),
+        ('name', 'Parac\u00e9tamol\u2028'),
+        ('quantity', 3),
+        ('ratio', 0.25),
+        ('is_booked', False),
+        ('attachment', None),
+    ])], 200),
+    ({1: 'one', 'big': 2 ** 70}, 200),
+])
+def test_fast_json_renderer_matches_custom_renderer(data, status_code):
+    renderer_context = {'response': Response(status=status_code)}
+    assert FastJSONRenderer().render(data, 'application/json', renderer_context) == \
+        CustomJSONRenderer().render(data, 'application/json', renderer_context)
+
+
+def test_fast_json_renderer_writes_equal_floats():
+    data = {'values': [0.1, 1e16, 1e-7, 1.5e300, -2.5e-300]}
+    renderer_context = {'response': Response(status=200)}
+    fast = FastJSONRenderer().render(data, 'application/json', renderer_context)
+    custom = CustomJSONRenderer().render(data, 'application/json', renderer_context)
+
+    assert json.loads(fast) == json.loads(custom)
+    assert b'1e16' in fast and b'1e+16' in custom
+
+
+def test_send_email_batch_uses_one_connection(mailoutbox, monkeypatch):
+    connections = []
+
+    original_get_connection = tasks.get_connection
+
+    def get_connection(*args, **kwargs):
+        connections.append(original_get_connection(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(tasks, 'get_connection', get_connection)
+    emails = [{'subject': 'Reminder', 'to': 'user{}@example.com'.format(i), 'message': 'Hi'} for i in range(5)]
+
+    assert tasks.send_email_batch(emails) == []
+    assert len(connections) == 1
+    assert [message.to for message in mailoutbox] == [[email['to']] for email in emails]
+
+
+def test_send_email_task_reuses_the_worker_connection(mailoutbox, monkeypatch):
+    connections = []
+    original_get_connection = tasks.get_connection
+
+    def get_connection(*args, **kwargs):
+        connections.append(original_get_connection(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(tasks, 'get_connection', get_connection)
+    monkeypatch.setattr(tasks, 'worker_connections', threading.local())
+    tasks.send_email('Reminder', 'user0@example.com', message='Hi')
+
+    # Closed by the server between two emails, reopened and sent again
+    send_messages = connections[0].send_messages
+    responses = [smtplib.SMTPServerDisconnected(), None]
+
+    def flaky_send_messages(messages):
+        response = responses.pop(0)
+        if response:
+            raise response
+        return send_messages(messages)
+
+    monkeypatch.setattr(connections[0], 'send_messages', flaky_send_messages)
+    tasks.send_email('Reminder', 'user1@example.com', message='Hi')
+
+    assert len(connections) == 1
+    assert [message.to for message in mailoutbox] == [['user0@example.com'], ['user1@example.com']]
+
+
+def test_send_email_batch_returns_only_failed_emails(mailoutbox):
+    emails = [{'subject': 'Reminder', 'to': 'user{}@example.com'.format(i), 'message': 'Hi'} for i in range(3)]
+    emails[1]['subject'] = 'Injected\nBcc: victim@example.com'
+
+    assert tasks.send_email_batch(emails) == [emails[1]]
+    assert [message.to for message in mailoutbox] == [['user0@example.com'], ['user2@example.com']]
+
+
+def test_send_mail_hands_emails_to_celery_right_away(settings, monkeypatch):
+    settings.ENABLE_CELERY = True
+    queued = []
+    monkeypatch.setattr(services.send_email, 'delay', lambda *args: queued.append(args))
+    monkeypatch.setattr(services.email_batcher, 'add', lambda email: pytest.fail('Email held in memory'))
+
+    services.send_mail('Reminder', 'user@example.com', message='Hi')
+    assert queued == [('Reminder', 'user@example.com', None, None, 'Hi')]
+
+
+def test_email_batcher_bounds_batch_size():
+    batches = []
+    batcher = EmailBatcher(batches.append, max_size=3, max_age=60)
+    for i in range(7):
+        batcher.add(i)
+    batcher.flush()
+
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert sorted(sum(batches, [])) == list(range(7))
+
+
+def test_email_batcher_retries_failed_emails():
+    attempts = []
+
+    def deliver(batch):
+        attempts.append(batch)
+        if len(attempts) == 1:
+            raise ConnectionRefusedError()
+        return [email for email in batch if email == 'bounce']
+
+    batcher = EmailBatcher(deliver, max_size=10, max_age=60, retries=2, backoff=0)
+    for email in ['first', 'bounce', 'last']:
+        batcher.add(email)
+    batcher.flush()
+
+    assert attempts == [['first', 'bounce', 'last'], ['first', 'bounce', 'last'], ['bounce']]
+
+
+def test_email_batcher_delivers_after_max_age():
+    delivered = threading.Event()
+    batcher = EmailBatcher(lambda batch: delivered.set(), max_size=100, max_age=0.05)
+    batcher.add('email')
+
+    assert delivered.wait(5)
+
+
+@pytest.mark.parametrize('template', [EmailTemplates.AUTH_VERIFICATION, EmailTemplates.AUTH_PASSWORD_RESET_REQUEST])
+@pytest.mark.parametrize('extension', ['.txt', '.html'])
+def test_cached_email_template_renders_like_render_to_string(template, extension):
+    context = {'data': {'verification_code': 123456, 'reset_url': 'http://localhost/reset?a=1&b=2'}}
+    assert render_email_template(template.format(extension), context) == \
+        render_to_string(template.format(extension), context)
+
+
+def test_warm_email_templates_compiles_templates_and_their_parents():
+    engine = get_email_engine()
+    assert len(set(engine.builtins)) == len(engine.builtins)
+    loader = engine.template_loaders[0]
+    loader.reset()
+    warm_email_templates()
+
+    origins = {template.origin.template_name for template in loader.get_template_cache.values()
+               if hasattr(template, 'origin')}
+    assert {'auth/verification.txt', 'auth/verification.html', 'base.html'} <= origins
+
+
+@pytest.mark.parametrize('sql, shape', [
+    ('SELECT * FROM "users_user" WHERE "users_user"."id" = %s', 'SELECT * FROM "users_user" WHERE "users_user"."id" = %s'),
+    ("SELECT * FROM t WHERE id = 42 AND name = 'it''s'", 'SELECT * FROM t WHERE id = %s AND name = %s'),
+    ('SELECT * FROM t WHERE id IN (%s, %s, %s)', 'SELECT * FROM t WHERE id IN (%s, ...)'),
+])
+def test_get_query_shape(sql, shape):
+    assert get_query_shape(sql) == shape
+
+
+def test_query_count_middleware_flags_repeated_queries(db, rf, settings, caplog):
+    settings.QUERY_COUNT_HEADERS = True
+
+    def get_response(request):
+        for pk in range(settings.QUERY_COUNT_DUPLICATE_THRESHOLD):
+            User.objects.filter(pk=pk).exists()
+        return Response()
+
+    response = QueryCountMiddleware(get_response)(rf.get('/users/'))
+    assert response['X-Query-Count'] == str(settings.QUERY_COUNT_DUPLICATE_THRESHOLD)
+    assert response['X-Duplicate-Queries'] == str(settings.QUERY_COUNT_DUPLICATE_THRESHOLD)
+    assert float(response['X-Query-Duration']) > 0
+    assert 'GET /users/ ran {} queries'.format(settings.QUERY_COUNT_DUPLICATE_THRESHOLD) in caplog.text
+
+
+def test_metrics_record_request_phases(patient_api_client, api_client, settings):
+    labels = {'view': 'RecommendedVaccineViewSet', 'action': 'list'}
+
+    def get_count(name, **extra):
+        return REGISTRY.get_sample_value(name, dict(labels, **extra)) or 0
+
+    phases = get_count('http_request_phase_duration_seconds_count', phase='auth')
+    exceptions = get_count('api_exceptions_total', exception='NotAuthenticated')
+    assert patient_api_client.get(reverse('vaccines-list')).status_code == 200
+    assert api_client.get(reverse('vaccines-list')).status_code == 401
+    assert get_count('http_request_phase_duration_seconds_count', phase='auth') == phases + 2
+    assert get_count('api_exceptions_total', exception='NotAuthenticated') == exceptions + 1
+
+    settings.METRICS_TOKEN = ''
+    assert api_client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code == 403
+    settings.METRICS_TOKEN = 'secret'
+    assert api_client.get(reverse('metrics')).status_code == 403
+    response = api_client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+    assert response.status_code == 200
+    assert b'http_request_duration_seconds_bucket{action="list"' in response.content
+
+
+class UserNamePagination(KeysetPagination):
+    ordering = ('first_name', 'id')
+    page_size = 2
+
+
+def test_keyset_pagination_bounds_the_leading_column(db):
+    User.objects.bulk_create([
+        User(username='user{}@example.com'.format(i), first_name=name) for i, name in enumerate('aabbbc')
+    ])
+    queryset = User.objects.filter(username__startswith='user')
+    names, url = [], '/users/'
+    while url:
+        paginator = UserNamePagination()
+        page = paginator.paginate_queryset(queryset, Request(APIRequestFactory().get(url)))
+        names += [user.first_name for user in page]
+        url = paginator.get_next_link()
+
+    assert names == list('aabbbc')
+    sql = str(queryset.filter(UserNamePagination().get_keyset_filter(['b', str(uuid.uuid4())])).query)
+    assert '"first_name" >= b' in sql
@@ -1,4 +1,11 @@
 import json
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.common.middleware import get_query_shape
 
 
 def get_response_data(response):
@@ -44,3 +51,15 @@ def assert_not_found(response):
     assert content["status"] == 'ERROR'
     assert content['errors'][0] == 'Not found.'
 
+
+
+@contextmanager
+def assert_max_queries(budget):
+    """Fail when the block runs more than `budget` queries, listing the repeated query shapes."""
+    with CaptureQueriesContext(connection) as context:
+        yield context
+    queries = context.captured_queries
+    repeated = Counter(get_query_shape(query['sql']) for query in queries).most_common()
+    assert len(queries) <= budget, '{} queries over a budget of {}, repeated:\n{}'.format(
+        len(queries), budget, '\n'.join('{} x {}'.format(count, shape) for shape, count in repeated if count > 1)
+    )
@@ -1,3 +1,15 @@
-from django.shortcuts import render
+import hmac
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from apps.common.metrics import get_registry
+
+
+def metrics(request):
+    """Metrics of every worker process in the Prometheus text format, only served once METRICS_TOKEN is set."""
+    authorization = request.headers.get('Authorization', '')
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(authorization, 'Bearer {}'.format(settings.METRICS_TOKEN)):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
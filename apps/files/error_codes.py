@@ -0,0 +1,12 @@
+from django.db.models import TextChoices
+
+
+class FileErrorCodes(TextChoices):
+    UPLOAD_HEADERS_REQUIRED = "Upload-Offset and Content-Length headers are required."
+    UPLOAD_OFFSET_MISMATCH = "Chunk offset does not match the upload offset. Please resume from the upload offset."
+    UPLOAD_CHUNK_EXCEEDS_SIZE = "Chunk goes past the declared upload size."
+    UPLOAD_CHUNK_TOO_LARGE = "Chunk is larger than the maximum chunk size."
+    UPLOAD_COMPLETING = "Upload is being completed, no more chunks are accepted."
+    UPLOAD_INCOMPLETE = "Upload is not complete yet. Please send the remaining chunks."
+    UPLOAD_CHECKSUM_MISMATCH = "Uploaded content does not match the given checksum. Please upload the file again."
+    UNKNOWN_CHECKSUM = "No stored content matches the given checksum. Please upload the file."
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.files.services import abort_expired_uploads
+
+
+class Command(BaseCommand):
+    help = 'Aborts resumable uploads left unfinished past their expiry, for deployments without Celery beat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        aborted = abort_expired_uploads(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Aborted {} uploads'.format(aborted)))
@@ -0,0 +1,74 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.files.models import File
+from apps.files.services import get_file_metadata
+from project import settings
+
+METADATA_FIELDS = ['size', 'content_type', 'content_encoding', 'checksum', 'created_date']
+
+
+def read_metadata(_file):
+    storage = _file.file.storage
+    if _file.blob_id:
+        size, checksum = _file.blob.size, _file.blob_id
+    else:
+        size, checksum = 0, hashlib.sha256()
+        with storage.open(_file.file.name, 'rb') as content:
+            for chunk in iter(lambda: content.read(settings.FILE_UPLOAD_READ_SIZE), b''):
+                size += len(chunk)
+                checksum.update(chunk)
+        checksum = checksum.hexdigest()
+
+    metadata = get_file_metadata(_file.file_name, size, checksum)
+    if _file.created_date is None:
+        try:
+            metadata['created_date'] = storage.get_modified_time(_file.file.name)
+        except NotImplementedError:
+            pass
+    return metadata
+
+
+class Command(BaseCommand):
+    help = 'Fills size, content type, checksum and upload date of files stored before they were recorded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8, help='Files read from storage in parallel')
+
+    def handle(self, *args, **options):
+        queryset = File.objects.filter(Q(size__isnull=True) | Q(checksum='') | Q(created_date__isnull=True))
+        updated = failed = 0
+        last_pk = None
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch_queryset = queryset.select_related('blob').order_by('pk')
+                if last_pk is not None:
+                    batch_queryset = batch_queryset.filter(pk__gt=last_pk)
+                batch = list(batch_queryset[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                futures = [(_file, executor.submit(read_metadata, _file)) for _file in batch]
+                changed = []
+                for _file, future in futures:
+                    try:
+                        metadata = future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write('Could not read file {}: {}'.format(_file.pk, e))
+                        continue
+                    for field, value in metadata.items():
+                        setattr(_file, field, value)
+                    changed.append(_file)
+
+                File.objects.bulk_update(changed, METADATA_FIELDS)
+                updated += len(changed)
+                self.stdout.write('Updated {} files'.format(updated))
+
+        self.stdout.write(self.style.SUCCESS('Backfilled {} files, {} failed'.format(updated, failed)))
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.files.services import delete_orphaned_blob_contents
+
+
+class Command(BaseCommand):
+    help = 'Deletes stored blob contents left behind by rolled back uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=60 * 60, help='Seconds a content is kept before deletion')
+
+    def handle(self, *args, **options):
+        deleted = delete_orphaned_blob_contents(min_age=timedelta(seconds=options['min_age']))
+        self.stdout.write(self.style.SUCCESS('Deleted {} orphaned blob contents'.format(deleted)))
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:37
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.TextField()),
+                ('path', models.TextField()),
+                ('size', models.BigIntegerField()),
+                ('offset', models.BigIntegerField(default=0)),
+                ('storage_upload_id', models.TextField(blank=True, default='')),
+                ('storage_parts', models.JSONField(default=list)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
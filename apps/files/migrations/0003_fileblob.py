@@ -0,0 +1,28 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_fileupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileBlob',
+            fields=[
+                ('checksum', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to='')),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='files', to='files.fileblob'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0003_fileblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='checksum',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='content_encoding',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='content_type',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='created_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
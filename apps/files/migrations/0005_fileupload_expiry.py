@@ -0,0 +1,25 @@
+# Generated by Django 3.2.5 on 2026-10-18 21:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='is_completing',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='expires_date',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.5 on 2026-10-18 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Existing files keep a NULL created date until backfill_file_metadata reads it from storage
+
+    dependencies = [
+        ('files', '0005_fileupload_expiry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='created_date',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.5 on 2026-10-18 23:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('files', '0006_file_created_date_auto_now_add'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='uploaded_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='files', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -5,15 +5,60 @@ from django.db import models
 
 import uuid
 
+from apps.users.models import User
+
 
 def file_path(instance, filename):
     return '{0}/{1}{2}'.format(strftime('%Y/%m/%d', localtime()), uuid.uuid4(), Path(filename).suffix)
 
 
+def blob_path(checksum):
+    return 'blobs/{0}/{1}/{2}'.format(checksum[:2], checksum[2:4], checksum)
+
+
+class FileBlob(models.Model):
+    """Content-addressed stored content, shared by every `File` with the same SHA-256 checksum."""
+    checksum = models.CharField(primary_key=True, max_length=64)
+    file = models.FileField()
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.checksum
+
+
 class File(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file = models.FileField(blank=False, null=False, upload_to=file_path)
     file_name = models.TextField()
+    blob = models.ForeignKey(FileBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='files')
+    # Recorded at upload time so downloads and listings never ask the storage backend
+    size = models.BigIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=255, blank=True, default='')
+    content_encoding = models.CharField(max_length=50, blank=True, default='')
+    checksum = models.CharField(max_length=64, blank=True, default='')
+    created_date = models.DateTimeField(auto_now_add=True, null=True)
+    # Only the uploader may attach the file elsewhere, anonymous uploads and files stored before have none
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='files')
+
+    def __str__(self):
+        return self.file_name
+
+
+class FileUpload(models.Model):
+    """An in-progress resumable upload, turned into a `File` once all of its bytes are received."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.TextField()
+    path = models.TextField()
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    storage_upload_id = models.TextField(blank=True, default='')
+    storage_parts = models.JSONField(default=list)
+    # Set once every byte is received, chunks are refused while the content is verified
+    is_completing = models.BooleanField(default=False)
+    created_date = models.DateTimeField(auto_now_add=True)
+    # Pushed back by every chunk, abandoned uploads are aborted once it has passed
+    expires_date = models.DateTimeField(db_index=True)
 
     def __str__(self):
         return self.file_name
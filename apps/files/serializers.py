@@ -1,11 +1,33 @@
 from rest_framework import serializers
-from .models import File
+from .models import File, FileUpload
 
 
 class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
         fields = "__all__"
+        read_only_fields = [
+            'blob', 'size', 'content_type', 'content_encoding', 'checksum', 'created_date', 'uploaded_by'
+        ]
         extra_kwargs = {
             'file_name': {'required': False}
         }
+
+
+class FileUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FileUpload
+        fields = ['id', 'file_name', 'size', 'offset', 'created_date', 'expires_date']
+        read_only_fields = ['offset', 'expires_date']
+        extra_kwargs = {
+            'size': {'min_value': 0}
+        }
+
+
+class FileUploadCompleteSerializer(serializers.Serializer):
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+
+
+class FileFromChecksumSerializer(serializers.Serializer):
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+    file_name = serializers.CharField()
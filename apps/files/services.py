@@ -0,0 +1,320 @@
+import hashlib
+import logging
+import mimetypes
+import re
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import ValidationError, NotFound
+
+from apps.common.exceptions import Conflict
+from apps.files.error_codes import FileErrorCodes
+from apps.files.models import File, FileBlob, FileUpload, file_path, blob_path
+from apps.files.uploads import get_chunked_upload, compute_checksum
+from project import settings
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+logger = logging.getLogger('apps.files.services')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def guess_content_type(file_name):
+    content_type, encoding = mimetypes.guess_type(file_name)
+    return content_type or 'application/octet-stream', encoding or ''
+
+
+def get_file_metadata(file_name, size, checksum):
+    content_type, content_encoding = guess_content_type(file_name)
+    return {
+        'size': size,
+        'content_type': content_type,
+        'content_encoding': content_encoding,
+        'checksum': checksum,
+    }
+
+
+def get_file_etag(_file):
+    if _file.checksum:
+        return '"{}"'.format(_file.checksum)
+    # Stored names are unique per upload, so the name identifies the content without reading it
+    return '"{}"'.format(hashlib.md5(_file.file.name.encode('utf-8')).hexdigest())
+
+
+def parse_range_header(header, size):
+    """Return the (start, end) byte positions, both inclusive, of a single range request.
+
+    Returns None when the header should be ignored (absent, malformed or multiple ranges),
+    raises RangeNotSatisfiable when the range lies outside of the file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if start == '' and end == '':
+        return None
+    if start == '':
+        suffix = int(end)
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        return max(size - suffix, 0), size - 1
+
+    start = int(start)
+    end = size - 1 if end == '' else min(int(end), size - 1)
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def iter_file_range(field_file, start, end, chunk_size):
+    """Stream bytes start..end (inclusive) of a stored file without loading it in memory."""
+    remaining = end - start + 1
+    field_file.open('rb')
+    try:
+        if start:
+            field_file.seek(start)
+        while remaining > 0:
+            chunk = field_file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        field_file.close()
+
+
+def get_upload_expiry():
+    return timezone.now() + timedelta(seconds=settings.FILE_UPLOAD_EXPIRE)
+
+
+def start_upload(file_name, size):
+    upload = FileUpload(
+        file_name=file_name, size=size, path=file_path(None, file_name), expires_date=get_upload_expiry()
+    )
+    get_chunked_upload(upload).start()
+    upload.save()
+    return upload
+
+
+def append_upload_chunk(upload_id, offset, stream, length):
+    """Write a chunk straight to storage, the upload row is locked so chunks of an upload are serialised."""
+    if length > settings.FILE_UPLOAD_MAX_CHUNK_SIZE:
+        raise ValidationError(FileErrorCodes.UPLOAD_CHUNK_TOO_LARGE)
+
+    with transaction.atomic():
+        upload = get_object_or_404(FileUpload.objects.select_for_update(), pk=upload_id)
+        if upload.is_completing:
+            raise Conflict(FileErrorCodes.UPLOAD_COMPLETING)
+        if offset != upload.offset:
+            raise Conflict(FileErrorCodes.UPLOAD_OFFSET_MISMATCH)
+        if upload.offset + length > upload.size:
+            raise ValidationError(FileErrorCodes.UPLOAD_CHUNK_EXCEEDS_SIZE)
+
+        try:
+            written = get_chunked_upload(upload).append(stream, length)
+        except ValueError as e:
+            raise ValidationError(str(e))
+        upload.offset += written
+        upload.expires_date = get_upload_expiry()
+        upload.save(update_fields=['offset', 'storage_parts', 'expires_date'])
+    return upload
+
+
+def complete_upload(upload_id, checksum, uploaded_by=None):
+    """Verify the SHA-256 checksum of the received content and turn the upload into a `File`.
+
+    The upload is marked as completing first, the content is then read back and hashed without holding
+    the row lock. An upload whose completion is interrupted is aborted once it expires.
+    """
+    with transaction.atomic():
+        upload = get_object_or_404(FileUpload.objects.select_for_update(), pk=upload_id)
+        if upload.is_completing:
+            raise Conflict(FileErrorCodes.UPLOAD_COMPLETING)
+        if upload.offset != upload.size:
+            raise ValidationError(FileErrorCodes.UPLOAD_INCOMPLETE)
+        upload.is_completing = True
+        upload.expires_date = get_upload_expiry()
+        upload.save(update_fields=['is_completing', 'expires_date'])
+
+    checksum = checksum.lower()
+    chunked_upload = get_chunked_upload(upload)
+    chunked_upload.complete()
+    is_valid = compute_checksum(chunked_upload.iter_content()) == checksum
+
+    with transaction.atomic():
+        if is_valid:
+            if not acquire_blob(checksum, upload.size, chunked_upload.move):
+                chunked_upload.discard()
+            _file = create_file(upload.file_name, checksum, upload.size, uploaded_by)
+        else:
+            chunked_upload.discard()
+        upload.delete()
+
+    if not is_valid:
+        raise ValidationError(FileErrorCodes.UPLOAD_CHECKSUM_MISMATCH)
+    return _file
+
+
+def abort_upload(upload):
+    get_chunked_upload(upload).abort()
+    upload.delete()
+
+
+def abort_expired_uploads(batch_size=100):
+    """Abort the uploads nobody resumed before they expired, returns the number of uploads aborted.
+
+    Uploads are claimed with SKIP LOCKED, so a chunk being written is never aborted under it. Uploads whose
+    storage refuses the abort are logged and left for the next sweep.
+    """
+    aborted = 0
+    while True:
+        with transaction.atomic():
+            uploads = list(FileUpload.objects.select_for_update(skip_locked=True).filter(
+                expires_date__lte=timezone.now()
+            ).order_by('expires_date')[:batch_size])
+            if not uploads:
+                return aborted
+
+            failed = 0
+            for upload in uploads:
+                try:
+                    abort_upload(upload)
+                except Exception:
+                    logger.exception('Could not abort upload %s', upload.pk)
+                    failed += 1
+                else:
+                    aborted += 1
+            if failed == len(uploads):
+                return aborted
+
+
+def acquire_blob(checksum, size, store):
+    """Take a reference on the blob holding the given content.
+
+    `store(name)` is only called to write the content when no blob holds it yet.
+    Returns whether the content has been written by `store`.
+
+    The blob row is locked, or created, before its content is looked at: `delete_unreferenced_blob` deletes the
+    content under the same row lock, so it can not vanish between the check and the reference being taken.
+    """
+    name = blob_path(checksum)
+    with transaction.atomic():
+        blob, created = FileBlob.objects.select_for_update().get_or_create(
+            pk=checksum, defaults={'file': name, 'size': size, 'ref_count': 1}
+        )
+        if not created:
+            FileBlob.objects.filter(pk=checksum).update(ref_count=F('ref_count') + 1)
+            # Referenced blobs always hold their content, an unreferenced one is checked for it
+            if blob.ref_count > 0 or default_storage.exists(name):
+                return False
+        else:
+            # Left behind by a rolled back upload, possibly only partially written
+            default_storage.delete(name)
+        store(name)
+        return True
+
+
+def release_blob(checksum):
+    """Drop a reference on a blob, its content is deleted once the release of the last reference is committed."""
+    with transaction.atomic():
+        blob = FileBlob.objects.select_for_update().filter(pk=checksum).first()
+        if blob is None or blob.ref_count == 0:
+            return
+        FileBlob.objects.filter(pk=checksum).update(ref_count=F('ref_count') - 1)
+        if blob.ref_count == 1:
+            transaction.on_commit(lambda: delete_unreferenced_blob(checksum))
+
+
+def delete_unreferenced_blob(checksum):
+    """Delete a blob and its content, unless it has been referenced again since its last release."""
+    with transaction.atomic():
+        blob = FileBlob.objects.select_for_update().filter(pk=checksum, ref_count=0).first()
+        if blob is None:
+            return
+        blob.delete()
+        # Deleted while the row is still locked so a concurrent upload of the same content writes it again
+        blob.file.delete(False)
+
+
+def delete_orphaned_blob_contents(min_age=timedelta(hours=1)):
+    """Delete blob contents no `FileBlob` references, returns the number of contents deleted.
+
+    Contents are written before the transaction creating their blob commits, a rolled back upload leaves them
+    behind. Younger contents than `min_age` are left alone, their upload may still be in progress.
+    """
+    deleted = 0
+    written_before = timezone.now() - min_age
+    for name in iter_blob_contents():
+        checksum = name.rsplit('/', 1)[-1]
+        if FileBlob.objects.filter(pk=checksum).exists():
+            continue
+        if default_storage.get_modified_time(name) > written_before:
+            continue
+        with transaction.atomic():
+            # A placeholder row holds back any concurrent upload of the same content until the deletion commits
+            blob, created = FileBlob.objects.select_for_update().get_or_create(
+                pk=checksum, defaults={'file': name, 'size': 0, 'ref_count': 0}
+            )
+            if not created:
+                continue
+            default_storage.delete(name)
+            blob.delete()
+        deleted += 1
+    return deleted
+
+
+def iter_blob_contents():
+    try:
+        first_levels = default_storage.listdir('blobs')[0]
+    except FileNotFoundError:
+        # Nothing has been uploaded to the local storage yet
+        return
+    for first in first_levels:
+        for second in default_storage.listdir('blobs/{}'.format(first))[0]:
+            directory = 'blobs/{}/{}'.format(first, second)
+            for checksum in default_storage.listdir(directory)[1]:
+                yield '{}/{}'.format(directory, checksum)
+
+
+def release_file_content(checksum, name):
+    """Release the content of a deleted or replaced `File`, files stored before deduplication own their content."""
+    if checksum:
+        release_blob(checksum)
+    else:
+        default_storage.delete(name)
+
+
+def store_uploaded_file(uploaded_file):
+    """Store an uploaded file content-addressed and return its checksum."""
+    checksum = getattr(uploaded_file, 'checksum', None) or compute_checksum(uploaded_file.chunks())
+    acquire_blob(checksum, uploaded_file.size, lambda name: default_storage.save(name, uploaded_file))
+    return checksum
+
+
+def create_file_from_checksum(checksum, file_name, uploaded_by=None):
+    """Create a `File` for content that is already stored, without uploading it again."""
+    checksum = checksum.lower()
+    with transaction.atomic():
+        blob = FileBlob.objects.select_for_update().filter(pk=checksum, ref_count__gt=0).first()
+        if blob is None:
+            raise NotFound(FileErrorCodes.UNKNOWN_CHECKSUM)
+        FileBlob.objects.filter(pk=checksum).update(ref_count=F('ref_count') + 1)
+        return create_file(file_name, checksum, blob.size, uploaded_by)
+
+
+def create_file(file_name, checksum, size, uploaded_by=None):
+    return File.objects.create(
+        file=blob_path(checksum),
+        file_name=file_name,
+        blob_id=checksum,
+        uploaded_by=uploaded_by,
+        **get_file_metadata(file_name, size, checksum)
+    )
@@ -0,0 +1,13 @@
+from celery import shared_task
+
+from .services import abort_expired_uploads, delete_orphaned_blob_contents
+
+
+@shared_task
+def abort_expired_file_uploads():
+    return abort_expired_uploads()
+
+
+@shared_task
+def delete_orphaned_file_blobs():
+    return delete_orphaned_blob_contents()
@@ -0,0 +1,239 @@
+import hashlib
+import io
+import os
+from datetime import timedelta
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.common.tests.utils import get_response_data, assert_validation_error
+from apps.files.error_codes import FileErrorCodes
+from apps.files.models import File, FileBlob, FileUpload, blob_path
+from apps.files.upload_handlers import HashingMemoryFileUploadHandler, HashingTemporaryFileUploadHandler
+
+
+@pytest.fixture
+def stored_file(db, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return File.objects.create(
+        file=SimpleUploadedFile('report.txt', b'0123456789' * 10),
+        file_name='report.txt'
+    )
+
+
+def test_download_file(api_client, stored_file):
+    url = reverse('files-download', args=[stored_file.pk])
+    response = api_client.get(url)
+
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content) == b'0123456789' * 10
+    assert response['Content-Length'] == '100'
+    assert response['Accept-Ranges'] == 'bytes'
+
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+
+
+def test_download_file_range(api_client, stored_file):
+    url = reverse('files-download', args=[stored_file.pk])
+    response = api_client.get(url, HTTP_RANGE='bytes=5-14')
+
+    assert response.status_code == 206
+    assert b''.join(response.streaming_content) == b'5678901234'
+    assert response['Content-Range'] == 'bytes 5-14/100'
+
+    response = api_client.get(url, HTTP_RANGE='bytes=-3')
+    assert b''.join(response.streaming_content) == b'789'
+
+    response = api_client.get(url, HTTP_RANGE='bytes=200-')
+    assert response.status_code == 416
+    assert response['Content-Range'] == 'bytes */100'
+
+
+def test_resumable_upload(api_client, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    content = b'resumable upload content'
+
+    response = api_client.post(reverse('files-upload-init'), {'file_name': 'scan.pdf', 'size': len(content)}, format='json')
+    assert response.status_code == 201
+    upload_id = get_response_data(response)['data']['id']
+
+    url = reverse('files-upload-chunk', args=[upload_id])
+    response = api_client.patch(url, content[:10], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0')
+    assert response.status_code == 200
+    assert response['Upload-Offset'] == '10'
+
+    response = api_client.patch(url, content[5:], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='5')
+    assert response.status_code == 409
+
+    response = api_client.patch(url, content[10:], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='10')
+    assert get_response_data(response)['data']['offset'] == len(content)
+
+    url = reverse('files-upload-complete', args=[upload_id])
+    response = api_client.post(url, {'checksum': hashlib.sha256(content).hexdigest()}, format='json')
+    assert response.status_code == 201
+    _file = File.objects.get(pk=get_response_data(response)['data']['id'])
+    assert _file.file_name == 'scan.pdf'
+    assert _file.file.read() == content
+    assert not FileUpload.objects.exists()
+
+
+def test_resumable_upload_checksum_mismatch(api_client, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    response = api_client.post(reverse('files-upload-init'), {'file_name': 'scan.pdf', 'size': 4}, format='json')
+    upload_id = get_response_data(response)['data']['id']
+    api_client.patch(
+        reverse('files-upload-chunk', args=[upload_id]),
+        b'data',
+        content_type='application/octet-stream',
+        HTTP_UPLOAD_OFFSET='0'
+    )
+
+    url = reverse('files-upload-complete', args=[upload_id])
+    response = api_client.post(url, {'checksum': hashlib.sha256(b'other').hexdigest()}, format='json')
+    errors = assert_validation_error(response)
+    assert errors[0] == FileErrorCodes.UPLOAD_CHECKSUM_MISMATCH
+    assert not File.objects.exists()
+
+
+def test_abort_expired_uploads(api_client, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    upload_ids = []
+    for _ in range(2):
+        response = api_client.post(reverse('files-upload-init'), {'file_name': 'scan.pdf', 'size': 8}, format='json')
+        upload_ids.append(get_response_data(response)['data']['id'])
+        api_client.patch(
+            reverse('files-upload-chunk', args=[upload_ids[-1]]), b'data',
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0'
+        )
+    expired, active = FileUpload.objects.get(pk=upload_ids[0]), FileUpload.objects.get(pk=upload_ids[1])
+    FileUpload.objects.filter(pk=expired.pk).update(expires_date=timezone.now() - timedelta(seconds=1))
+
+    call_command('abort_expired_uploads', stdout=io.StringIO())
+
+    assert list(FileUpload.objects.values_list('pk', flat=True)) == [active.pk]
+    assert not (tmp_path / expired.path).exists()
+    assert (tmp_path / active.path).exists()
+
+
+def test_upload_deduplicates_content(api_client, doctor_api_client, settings, tmp_path,
+                                     django_capture_on_commit_callbacks):
+    settings.MEDIA_ROOT = str(tmp_path)
+    url = reverse('files-list')
+    first = get_response_data(api_client.post(url, {'file': SimpleUploadedFile('letter.pdf', b'referral')}))['data']
+    second = get_response_data(api_client.post(url, {'file': SimpleUploadedFile('copy.pdf', b'referral')}))['data']
+
+    checksum = hashlib.sha256(b'referral').hexdigest()
+    assert first['blob'] == second['blob'] == checksum
+    assert first['file'] == second['file']
+    blob = FileBlob.objects.get()
+    assert blob.ref_count == 2
+
+    url = reverse('files-by-checksum')
+    response = api_client.post(url, {'checksum': checksum, 'file_name': 'again.pdf'}, format='json')
+    assert response.status_code == 401
+    response = doctor_api_client.post(url, {'checksum': checksum, 'file_name': 'again.pdf'}, format='json')
+    assert response.status_code == 201
+    assert get_response_data(response)['data']['uploaded_by'] == str(doctor_api_client.user.pk)
+    assert FileBlob.objects.get().ref_count == 3
+
+    for _file in File.objects.all():
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.delete(reverse('files-detail', args=[_file.pk]))
+        if File.objects.exists():
+            assert blob.file.storage.exists(blob.file.name)
+    assert not FileBlob.objects.exists()
+    assert not blob.file.storage.exists(blob.file.name)
+
+
+def test_upload_rewrites_content_of_unreferenced_blob(api_client, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    checksum = hashlib.sha256(b'referral').hexdigest()
+    # Released, its content deleted, the row not yet
+    FileBlob.objects.create(checksum=checksum, file=blob_path(checksum), size=8, ref_count=0)
+
+    response = api_client.post(reverse('files-list'), {'file': SimpleUploadedFile('letter.pdf', b'referral')})
+
+    assert response.status_code == 201
+    blob = FileBlob.objects.get()
+    assert blob.ref_count == 1
+    assert blob.file.read() == b'referral'
+
+
+def test_delete_orphaned_blobs(db, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    referenced, orphaned, recent = (hashlib.sha256(content).hexdigest() for content in (b'a', b'b', b'c'))
+    for checksum in (referenced, orphaned, recent):
+        default_storage.save(blob_path(checksum), ContentFile(b'content'))
+    FileBlob.objects.create(checksum=referenced, file=blob_path(referenced), size=7, ref_count=1)
+    old = (timezone.now() - timedelta(hours=2)).timestamp()
+    for checksum in (referenced, orphaned):
+        os.utime(default_storage.path(blob_path(checksum)), (old, old))
+
+    call_command('delete_orphaned_blobs', stdout=io.StringIO())
+
+    assert default_storage.exists(blob_path(referenced))
+    assert not default_storage.exists(blob_path(orphaned))
+    assert default_storage.exists(blob_path(recent))
+    assert list(FileBlob.objects.values_list('pk', flat=True)) == [referenced]
+
+
+def test_create_file_from_unknown_checksum(doctor_api_client):
+    response = doctor_api_client.post(
+        reverse('files-by-checksum'),
+        {'checksum': hashlib.sha256(b'unknown').hexdigest(), 'file_name': 'letter.pdf'},
+        format='json'
+    )
+    assert response.status_code == 404
+
+
+def test_upload_records_metadata(api_client, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    response = api_client.post(reverse('files-list'), {'file': SimpleUploadedFile('scan.png', b'image')})
+    content = get_response_data(response)['data']
+    assert content['uploaded_by'] is None
+    assert content['size'] == 5
+    assert content['content_type'] == 'image/png'
+    assert content['checksum'] == hashlib.sha256(b'image').hexdigest()
+    assert content['created_date']
+
+
+def test_large_uploads_are_hashed_once(settings):
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 4
+    content = b'too large for memory'
+    handlers = [HashingMemoryFileUploadHandler(), HashingTemporaryFileUploadHandler()]
+    for handler in handlers:
+        handler.handle_raw_input(None, {}, len(content), 'boundary')
+        handler.new_file('file', 'scan.pdf', 'application/pdf', len(content))
+
+    for handler in handlers:
+        if handler.receive_data_chunk(content, 0) is None:
+            break
+    uploaded_file = handlers[1].file_complete(len(content))
+
+    assert handlers[0].checksum.hexdigest() == hashlib.sha256().hexdigest()
+    assert uploaded_file.checksum == hashlib.sha256(content).hexdigest()
+
+
+def test_backfill_file_metadata(stored_file):
+    call_command('backfill_file_metadata', '--workers', '2', stdout=io.StringIO())
+
+    stored_file.refresh_from_db()
+    assert stored_file.size == 100
+    assert stored_file.content_type == 'text/plain'
+    assert stored_file.checksum == hashlib.sha256(b'0123456789' * 10).hexdigest()
+
+
+def test_backfill_file_metadata_reads_created_date_from_storage(stored_file):
+    # Files stored before the column existed have no created date
+    File.objects.filter(pk=stored_file.pk).update(created_date=None)
+
+    call_command('backfill_file_metadata', stdout=io.StringIO())
+
+    stored_file.refresh_from_db()
+    assert stored_file.created_date == stored_file.file.storage.get_modified_time(stored_file.file.name)
@@ -0,0 +1,36 @@
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingUploadHandlerMixin:
+    """Computes the SHA-256 checksum of an uploaded file while its chunks stream in.
+
+    Only the handler keeping the data hashes it, chunks passed on to the next handler (a file too
+    large for memory) are hashed there.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Set up first, the memory handler stops the handler chain from new_file
+        self.checksum = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            self.checksum.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.checksum = self.checksum.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
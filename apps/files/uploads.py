@@ -0,0 +1,154 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import default_storage
+
+from project import settings
+
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class LocalChunkedUpload:
+    """Appends chunks in place to the final file under MEDIA_ROOT."""
+
+    def __init__(self, upload, storage=default_storage):
+        self.upload = upload
+        self.storage = storage
+
+    @property
+    def full_path(self):
+        return self.storage.path(self.upload.path)
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.full_path), exist_ok=True)
+        open(self.full_path, 'wb').close()
+
+    def append(self, stream, length):
+        written = 0
+        with open(self.full_path, 'r+b') as destination:
+            # Bytes past the recorded offset belong to an interrupted chunk and are overwritten
+            destination.seek(self.upload.offset)
+            while written < length:
+                chunk = stream.read(min(settings.FILE_UPLOAD_READ_SIZE, length - written))
+                if not chunk:
+                    break
+                destination.write(chunk)
+                written += len(chunk)
+            destination.truncate()
+        return written
+
+    def complete(self):
+        pass
+
+    def abort(self):
+        self.storage.delete(self.upload.path)
+
+    def move(self, name):
+        target = self.storage.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.full_path, target)
+        return name
+
+    def discard(self):
+        self.storage.delete(self.upload.path)
+
+    def iter_content(self):
+        with open(self.full_path, 'rb') as source:
+            for chunk in iter(lambda: source.read(settings.FILE_UPLOAD_READ_SIZE), b''):
+                yield chunk
+
+
+class S3ChunkedUpload:
+    """Sends every chunk as one part of an S3 multipart upload."""
+
+    def __init__(self, upload, storage=default_storage):
+        self.upload = upload
+        self.storage = storage
+        self.client = storage.bucket.meta.client
+        self.key = storage._normalize_name(storage._clean_name(upload.path))
+
+    def start(self):
+        response = self.client.create_multipart_upload(Bucket=self.storage.bucket.name, Key=self.key)
+        self.upload.storage_upload_id = response['UploadId']
+
+    def append(self, stream, length):
+        if self.upload.offset + length < self.upload.size and length < S3_MIN_PART_SIZE:
+            raise ValueError('Every chunk but the last one should be at least {} bytes'.format(S3_MIN_PART_SIZE))
+
+        # A part is only stored by S3 once it has been received entirely, the chunk is spooled to disk past
+        # FILE_UPLOAD_MAX_MEMORY_SIZE rather than held in memory
+        with tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE) as body:
+            received = 0
+            while received < length:
+                chunk = stream.read(min(settings.FILE_UPLOAD_READ_SIZE, length - received))
+                if not chunk:
+                    return 0
+                body.write(chunk)
+                received += len(chunk)
+            body.seek(0)
+
+            part_number = len(self.upload.storage_parts) + 1
+            response = self.client.upload_part(
+                Bucket=self.storage.bucket.name,
+                Key=self.key,
+                UploadId=self.upload.storage_upload_id,
+                PartNumber=part_number,
+                ContentLength=length,
+                Body=body
+            )
+        self.upload.storage_parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+        return length
+
+    def complete(self):
+        if not self.upload.storage_parts:
+            # S3 refuses to complete a multipart upload without parts
+            self.abort()
+            self.client.put_object(Bucket=self.storage.bucket.name, Key=self.key, Body=b'')
+            return
+        self.client.complete_multipart_upload(
+            Bucket=self.storage.bucket.name,
+            Key=self.key,
+            UploadId=self.upload.storage_upload_id,
+            MultipartUpload={'Parts': self.upload.storage_parts}
+        )
+
+    def abort(self):
+        try:
+            self.client.abort_multipart_upload(
+                Bucket=self.storage.bucket.name,
+                Key=self.key,
+                UploadId=self.upload.storage_upload_id
+            )
+        except self.client.exceptions.NoSuchUpload:
+            # Completed already, what is left is the assembled object
+            self.discard()
+
+    def move(self, name):
+        self.client.copy(
+            {'Bucket': self.storage.bucket.name, 'Key': self.key},
+            self.storage.bucket.name,
+            self.storage._normalize_name(self.storage._clean_name(name))
+        )
+        self.discard()
+        return name
+
+    def discard(self):
+        self.client.delete_object(Bucket=self.storage.bucket.name, Key=self.key)
+
+    def iter_content(self):
+        body = self.client.get_object(Bucket=self.storage.bucket.name, Key=self.key)['Body']
+        return body.iter_chunks(settings.FILE_UPLOAD_READ_SIZE)
+
+
+def get_chunked_upload(upload):
+    if settings.DEFAULT_STORAGE == 'AWS':
+        return S3ChunkedUpload(upload)
+    return LocalChunkedUpload(upload)
+
+
+def compute_checksum(chunks):
+    checksum = hashlib.sha256()
+    for chunk in chunks:
+        checksum.update(chunk)
+    return checksum.hexdigest()
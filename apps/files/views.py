@@ -1,17 +1,27 @@
 from django.db.models.signals import post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from django.shortcuts import get_object_or_404
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import MultiPartParser, JSONParser
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
-from django.http import HttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from rest_framework import status
 
 from rest_framework.viewsets import ModelViewSet
 
-from apps.files.serializers import FileSerializer
-from apps.files.models import File
+from apps.files.error_codes import FileErrorCodes
+from apps.files.serializers import FileSerializer, FileUploadSerializer, FileUploadCompleteSerializer, \
+    FileFromChecksumSerializer
+from apps.files.models import File, FileUpload, blob_path
+from apps.common.etags import etag_matches
+from apps.files.services import get_file_etag, parse_range_header, iter_file_range, \
+    RangeNotSatisfiable, start_upload, append_upload_chunk, complete_upload, abort_upload, release_file_content, \
+    store_uploaded_file, create_file_from_checksum, guess_content_type, get_file_metadata
 
-import mimetypes
+from urllib.parse import quote
 
 from project import settings
 
@@ -22,44 +32,168 @@ class FileViewSet(ModelViewSet):
     parser_classes = (MultiPartParser,)
 
     def get_permissions(self):
-        if settings.ANONYMOUS_FILE_UPLOAD:
+        # Creating a file from a checksum reveals whether anyone stored that content, never allowed anonymously
+        if settings.ANONYMOUS_FILE_UPLOAD and self.action != 'by_checksum':
             permission_classes = []
         else:
             permission_classes = [IsAuthenticated]
 
         return [permission() for permission in permission_classes]
 
+    def get_uploader(self):
+        return self.request.user if self.request.user.is_authenticated else None
+
     @action(methods=['get'], detail=True)
     def download(self, request, pk=None):
         _file = get_object_or_404(File, pk=pk)
-        response = HttpResponse(_file.file)
 
-        file_type, encoding = mimetypes.guess_type(_file.file_name)
-        if file_type is None:
-            file_type = 'application/octet-stream'
+        etag = get_file_etag(_file)
+        if etag_matches(request.META.get('HTTP_IF_NONE_MATCH', ''), etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        if _file.content_type:
+            file_type, encoding = _file.content_type, _file.content_encoding
+        else:
+            file_type, encoding = guess_content_type(_file.file_name)
+        content_disposition = 'attachment; ' + self.get_filename_header(request, _file.file_name)
+
+        if settings.FILE_DOWNLOAD_ACCEL_REDIRECT_PREFIX:
+            # Let the front-end server send the bytes, it also takes care of range requests
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = settings.FILE_DOWNLOAD_ACCEL_REDIRECT_PREFIX + quote(_file.file.name)
+        elif settings.DEFAULT_STORAGE == 'AWS' and settings.FILE_DOWNLOAD_S3_REDIRECT:
+            return HttpResponseRedirect(_file.file.storage.url(
+                _file.file.name,
+                parameters={
+                    'ResponseContentType': file_type,
+                    'ResponseContentDisposition': content_disposition,
+                },
+                expire=settings.FILE_DOWNLOAD_S3_REDIRECT_EXPIRE
+            ))
+        else:
+            response = self.stream_file(request, _file, etag)
+            if response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE:
+                return response
 
         response['Content-Type'] = file_type
-        response['Content-Length'] = str(_file.file.size)
-        if encoding is not None:
+        response['ETag'] = etag
+        if encoding:
             response['Content-Encoding'] = encoding
+        response['Content-Disposition'] = content_disposition
+        return response
 
-        if u'WebKit' in request.META['HTTP_USER_AGENT']:
+    def stream_file(self, request, _file, etag):
+        size = _file.size if _file.size is not None else _file.file.size
+        byte_range = None
+        if request.META.get('HTTP_IF_RANGE', etag) == etag:
+            try:
+                byte_range = parse_range_header(request.META.get('HTTP_RANGE'), size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = 'bytes */%d' % size
+                return response
+
+        start, end = byte_range if byte_range else (0, size - 1)
+        response = StreamingHttpResponse(
+            iter_file_range(_file.file, start, end, settings.FILE_DOWNLOAD_CHUNK_SIZE),
+            status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+        )
+        if byte_range:
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+        response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    @staticmethod
+    def get_filename_header(request, file_name):
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        if u'WebKit' in user_agent:
             # Safari 3.0 and Chrome 2.0
-            filename_header = 'filename=%s' % _file.file_name
-        elif u'MSIE' in request.META['HTTP_USER_AGENT']:
+            return 'filename=%s' % file_name
+        elif u'MSIE' in user_agent:
             # IE does not support internationalized filename at all
-            filename_header = ''
+            return ''
         else:
             # For others like Firefox
-            filename_header = 'filename*=UTF-8\'\'%s' % _file.file_name
-
-        response['Content-Disposition'] = 'attachment; ' + filename_header
+            return 'filename*=UTF-8\'\'%s' % file_name
+
+    @action(methods=['post'], detail=False, url_path='uploads', parser_classes=[JSONParser, MultiPartParser])
+    def upload_init(self, request):
+        serializer = FileUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = start_upload(**serializer.validated_data)
+        return self.get_upload_response(upload, status.HTTP_201_CREATED)
+
+    @action(methods=['get', 'patch', 'delete'], detail=False, url_path=r'uploads/(?P<upload_id>[^/.]+)')
+    def upload_chunk(self, request, upload_id=None):
+        if request.method == 'PATCH':
+            # The chunk is read from the raw body stream, it is never parsed nor buffered by Django
+            try:
+                offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except (KeyError, ValueError):
+                raise ValidationError(FileErrorCodes.UPLOAD_HEADERS_REQUIRED)
+            upload = append_upload_chunk(upload_id, offset, request.stream, length)
+            return self.get_upload_response(upload)
+
+        upload = get_object_or_404(FileUpload, pk=upload_id)
+        if request.method == 'DELETE':
+            abort_upload(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.get_upload_response(upload)
+
+    @action(methods=['post'], detail=False, url_path=r'uploads/(?P<upload_id>[^/.]+)/complete',
+            parser_classes=[JSONParser, MultiPartParser])
+    def upload_complete(self, request, upload_id=None):
+        serializer = FileUploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        _file = complete_upload(upload_id, serializer.validated_data['checksum'], self.get_uploader())
+        return Response(FileSerializer(_file).data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def get_upload_response(upload, response_status=status.HTTP_200_OK):
+        response = Response(FileUploadSerializer(upload).data, status=response_status)
+        response['Upload-Offset'] = str(upload.offset)
         return response
 
+    @action(methods=['post'], detail=False, url_path='by-checksum', parser_classes=[JSONParser, MultiPartParser])
+    def by_checksum(self, request):
+        serializer = FileFromChecksumSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        _file = create_file_from_checksum(uploaded_by=self.get_uploader(), **serializer.validated_data)
+        return Response(FileSerializer(_file).data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(file_name=serializer.validated_data['file'].name)
+        uploaded_file = serializer.validated_data['file']
+        checksum = store_uploaded_file(uploaded_file)
+        serializer.save(
+            file=blob_path(checksum),
+            file_name=uploaded_file.name,
+            blob_id=checksum,
+            uploaded_by=self.get_uploader(),
+            **get_file_metadata(uploaded_file.name, uploaded_file.size, checksum)
+        )
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        if 'file' not in serializer.validated_data:
+            return super().perform_update(serializer)
+
+        previous_blob_id, previous_name = serializer.instance.blob_id, serializer.instance.file.name
+        uploaded_file = serializer.validated_data['file']
+        checksum = store_uploaded_file(uploaded_file)
+        serializer.save(
+            file=blob_path(checksum),
+            file_name=uploaded_file.name,
+            blob_id=checksum,
+            **get_file_metadata(uploaded_file.name, uploaded_file.size, checksum)
+        )
+        release_file_content(previous_blob_id, previous_name)
 
 
 @receiver(post_delete, sender=File)
 def submission_delete(sender, instance, **kwargs):
-    instance.file.delete(False)
+    release_file_content(instance.blob_id, instance.file.name)
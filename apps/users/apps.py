@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AuthConfig(AppConfig):
     name = 'apps.users'
+
+    def ready(self):
+        from apps.users import signals  # noqa: F401
@@ -0,0 +1,60 @@
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.common.metrics import record_phase
+from project import settings
+
+# What permissions and most views read from `request.user`, the other fields, the password hash
+# amongst them, are loaded from the database when accessed
+CACHED_USER_FIELDS = ('id', 'email', 'first_name', 'last_name', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+# Invalidations would only reach the worker process running them
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def get_user_cache_key(user_id):
+    return 'users:{}'.format(user_id)
+
+
+def invalidate_cached_user(user_id):
+    key = get_user_cache_key(user_id)
+    cache.delete(key)
+    # Again after commit, a request may have cached the old row in between
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def is_user_cache_enabled():
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_CACHES)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication resolving the token's user from the cache instead of querying it on every request.
+
+    Cached users are dropped whenever the user is saved or deleted, see `apps.users.signals`. Users are not
+    cached at all with a process-local cache backend, other workers would keep serving dropped users.
+    """
+
+    def authenticate(self, request):
+        with record_phase('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not is_user_cache_enabled():
+            return super().get_user(validated_token)
+
+        field_names = [
+            field.attname for field in self.user_model._meta.concrete_fields if field.name in CACHED_USER_FIELDS
+        ]
+        key = get_user_cache_key(user_id)
+        values = cache.get(key)
+        if values is not None:
+            return self.user_model.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+        user = super().get_user(validated_token)
+        cache.set(key, [getattr(user, name) for name in field_names], settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
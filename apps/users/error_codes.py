@@ -7,3 +7,8 @@ class AccountErrorCodes(TextChoices):
     UNKNOWN_USER = "Unable to find the user. Please try Again."
     INVALID_PASSWORD = "Given password is incorrect. Please try Again."
     INVALID_TOKEN = "Given password reset token is incorrect. Please try Again."
+    IMPORT_FORMAT_UNSUPPORTED = "Unsupported file format. Please upload a CSV or JSONL file."
+    IMPORT_ROW_INVALID = "Row is not a valid JSON object."
+    IMPORT_DUPLICATE_EMAIL = "Email appears more than once in the import."
+    IMPORT_ENCODING_INVALID = "File is not UTF-8 encoded."
+    IMPORT_TOO_MANY_ROWS = "Too many rows to import at once, split the file or use the import_users command."
@@ -0,0 +1,16 @@
+"""Password hashing in worker processes. Kept free of model imports, spawned workers import it before Django
+is set up."""
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+def init_hash_worker(password_hashers):
+    if not apps.ready:
+        django.setup()
+    settings.PASSWORD_HASHERS = password_hashers
+
+
+def hash_passwords(passwords):
+    return [make_password(password) for password in passwords]
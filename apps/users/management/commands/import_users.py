@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from apps.users.error_codes import AccountErrorCodes
+from apps.users.services import get_import_format, import_users, read_user_rows
+
+
+class Command(BaseCommand):
+    help = 'Creates users from a CSV or JSONL file with first_name, last_name, email, password and role'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1, help='Password hashing processes, all cores by default'
+        )
+
+    def handle(self, *args, **options):
+        import_format = options['format'] or get_import_format(options['path'])
+        if import_format is None:
+            raise CommandError(AccountErrorCodes.IMPORT_FORMAT_UNSUPPORTED)
+
+        with open(options['path'], 'rb') as stream:
+            try:
+                created, failed = import_users(
+                    read_user_rows(stream, import_format), chunk_size=options['chunk_size'],
+                    workers=options['workers']
+                )
+            except ValidationError as e:
+                raise CommandError(e.detail[0])
+
+        for error in failed:
+            self.stderr.write('Row {}: {}'.format(error['row'], error['errors']))
+        self.stdout.write(self.style.SUCCESS('Imported {} users, {} failed'.format(created, len(failed))))
@@ -36,6 +36,12 @@ class User(AbstractUser, SafeDeleteModel):
     def is_user(self):
         return self.role == Roles.USER
 
+    def is_doctor(self):
+        return self.role == Roles.DOCTOR
+
+    def is_patient(self):
+        return self.role == Roles.PATIENT
+
     def generate_email_verification_code(self):
         verification = self.email_verifications.create(code=generate_token(6))
         send_mail(
@@ -48,6 +48,16 @@ class IsSuperAdmin(BasePermission):
         return request.user.is_super_admin()
 
 
+class IsDoctor(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_doctor()
+
+
+class IsPatient(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_patient()
+
+
 class NotAllowed(BasePermission):
     def has_permission(self, request, view):
         raise PermissionDenied()
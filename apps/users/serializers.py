@@ -77,6 +77,25 @@ class UserSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
+class UserImportRowSerializer(serializers.ModelSerializer):
+    # The email is also the username, which is limited to 150 characters
+    email = serializers.EmailField(required=True, max_length=150)
+
+    class Meta:
+        model = get_user_model()
+        fields = ['first_name', 'last_name', 'email', 'password', 'role']
+        extra_kwargs = {
+            'first_name': {'required': True},
+            'last_name': {'required': True},
+            'password': {'min_length': 6},
+        }
+
+
+class UserImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False)
+
+
 class PasswordChangeSerializer(serializers.ModelSerializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True, min_length=6)
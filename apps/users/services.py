@@ -1,8 +1,26 @@
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
+from django.db import DataError, IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
 
 from apps.common.email_templates import EmailTemplates
 from apps.common.services import send_mail
+from apps.users.error_codes import AccountErrorCodes
+from apps.users.hashing import hash_passwords, init_hash_worker
+from apps.users.serializers import UserImportRowSerializer
+
+IMPORT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+# Passwords hashed per task sent to the process pool
+HASH_BATCH_SIZE = 20
 
 
 def request_password_reset(user):
@@ -15,3 +33,124 @@ def request_password_reset(user):
         EmailTemplates.AUTH_PASSWORD_RESET_REQUEST,
         data
     )
+
+
+def get_import_format(file_name):
+    return IMPORT_FORMATS.get(os.path.splitext(file_name)[1].lower())
+
+
+def read_user_rows(stream, import_format):
+    """Yield (row number, data) for every user in a binary CSV or JSONL stream, data is None for unreadable rows.
+
+    Raises a ValidationError when the stream is not UTF-8.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from parse_user_rows(text, import_format)
+    except UnicodeDecodeError:
+        raise ValidationError(AccountErrorCodes.IMPORT_ENCODING_INVALID)
+
+
+def parse_user_rows(text, import_format):
+    if import_format == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, row
+    else:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            yield number, data if isinstance(data, dict) else None
+
+
+def iter_hashed_passwords(passwords, workers=None):
+    """Hash passwords in order, spread over `workers` processes since every PBKDF2 hash costs tens of milliseconds.
+
+    Workers are spawned rather than forked, forking a process running threads (e.g. email delivery) can deadlock.
+    """
+    batches = [passwords[i:i + HASH_BATCH_SIZE] for i in range(0, len(passwords), HASH_BATCH_SIZE)]
+    if workers == 1 or len(batches) <= 1:
+        yield from hash_passwords(passwords)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_hash_worker, initargs=(settings.PASSWORD_HASHERS,)) as executor:
+        for hashed in executor.map(hash_passwords, batches):
+            yield from hashed
+
+
+def insert_users(rows):
+    """Insert (row number, user) pairs at once, falling back to one by one to find rows conflicting
+    with users created in the meantime."""
+    try:
+        with transaction.atomic():
+            get_user_model().objects.bulk_create([user for _, user in rows])
+        return len(rows), []
+    except (IntegrityError, DataError):
+        pass
+
+    created, errors = 0, []
+    for number, user in rows:
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+            created += 1
+        except IntegrityError:
+            errors.append({'row': number, 'errors': [AccountErrorCodes.USER_EXIST]})
+        except DataError:
+            errors.append({'row': number, 'errors': [AccountErrorCodes.IMPORT_ROW_INVALID]})
+    return created, errors
+
+
+def import_users(rows, chunk_size=500, workers=1, max_rows=None):
+    """Create users from (row number, data) pairs, see `read_user_rows`.
+
+    Rows that are invalid or whose email is taken are reported and skipped without stopping the import.
+    Passwords are hashed across `workers` processes while users are inserted with `bulk_create` in chunks.
+    Nothing is imported and a ValidationError is raised when there are more than `max_rows` rows. Returns the
+    number of users created and the errors by row.
+    """
+    user_model = get_user_model()
+    errors, valid, emails = [], [], set()
+    for index, (number, data) in enumerate(rows):
+        if max_rows is not None and index >= max_rows:
+            raise ValidationError(AccountErrorCodes.IMPORT_TOO_MANY_ROWS)
+        if data is None:
+            errors.append({'row': number, 'errors': [AccountErrorCodes.IMPORT_ROW_INVALID]})
+            continue
+        serializer = UserImportRowSerializer(data=data)
+        if not serializer.is_valid():
+            errors.append({'row': number, 'errors': serializer.errors})
+            continue
+        if serializer.validated_data['email'] in emails:
+            errors.append({'row': number, 'errors': [AccountErrorCodes.IMPORT_DUPLICATE_EMAIL]})
+            continue
+        emails.add(serializer.validated_data['email'])
+        valid.append((number, serializer.validated_data))
+
+    existing = set()
+    for i in range(0, len(valid), chunk_size):
+        existing.update(user_model.objects.filter(
+            username__in=[data['email'] for _, data in valid[i:i + chunk_size]]
+        ).values_list('username', flat=True))
+    errors.extend({'row': number, 'errors': [AccountErrorCodes.USER_EXIST]}
+                  for number, data in valid if data['email'] in existing)
+    valid = [(number, data) for number, data in valid if data['email'] not in existing]
+
+    created = 0
+    passwords = iter_hashed_passwords([data['password'] for _, data in valid], workers)
+    rows = ((number, user_model(**dict(data, username=data['email'], password=password)))
+            for (number, data), password in zip(valid, passwords))
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        chunk_created, chunk_errors = insert_users(chunk)
+        created += chunk_created
+        errors.extend(chunk_errors)
+
+    errors.sort(key=lambda error: error['row'])
+    return created, errors
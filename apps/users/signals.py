@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from safedelete.signals import post_softdelete, post_undelete
+
+from apps.users.authentication import invalidate_cached_user
+from apps.users.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_softdelete, sender=User)
+@receiver(post_undelete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
@@ -1,5 +1,6 @@
 import pytest
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
@@ -23,6 +24,20 @@ class ApiClient(APIClient):
         return environ
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache."""
+    cache.clear()
+
+
+@pytest.fixture
+def shared_cache(settings, tmp_path):
+    """A cache backend shared across processes, users are only cached by `CachedJWTAuthentication` with one."""
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path)}
+    }
+
+
 @pytest.fixture
 def super_admin_user(db):
     """Return a Django super admin user."""
@@ -57,6 +72,34 @@ def user(db):
     )
 
 
+@pytest.fixture
+def doctor_user(db):
+    """Return a doctor."""
+    return User.objects.create_user(
+        email="doctor@example.com",
+        username="doctor@example.com",
+        password="password",
+        first_name="doctor",
+        is_staff=False,
+        is_active=True,
+        role=Roles.DOCTOR,
+    )
+
+
+@pytest.fixture
+def patient_user(db):
+    """Return a patient."""
+    return User.objects.create_user(
+        email="patient@example.com",
+        username="patient@example.com",
+        password="password",
+        first_name="patient",
+        is_staff=False,
+        is_active=True,
+        role=Roles.PATIENT,
+    )
+
+
 @pytest.fixture
 def admin_users(admin_user):
     """Return admin members."""
@@ -126,6 +169,16 @@ def user_api_client(user):
     return ApiClient(user=user)
 
 
+@pytest.fixture
+def doctor_api_client(doctor_user):
+    return ApiClient(user=doctor_user)
+
+
+@pytest.fixture
+def patient_api_client(patient_user):
+    return ApiClient(user=patient_user)
+
+
 @pytest.fixture
 def api_client(db):
     return ApiClient(user=AnonymousUser())
@@ -1,8 +1,22 @@
+import io
+import json
+
+import pytest
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
 
-from apps.common.tests.utils import get_response_data, assert_no_permission, assert_validation_error
+from apps.common.tests.utils import get_response_data, assert_max_queries, assert_no_permission, \
+    assert_validation_error
+from apps.users.authentication import CachedJWTAuthentication, get_user_cache_key
 from apps.users.error_codes import AccountErrorCodes
+from apps.users.models import Roles, User
+from apps.users.services import import_users, read_user_rows
+from project import settings as project_settings
 
 
 def test_user_self_join(api_client):
@@ -41,3 +55,124 @@ def test_user_self_join_with_invalid_data(api_client):
     assert errors[0]['email'][0] == 'Enter a valid email address.'
     assert errors[0]['confirm_password'][0] == AccountErrorCodes.PASSWORD_MISMATCH
 
+
+
+def authenticate(user):
+    token = RefreshToken.for_user(user).access_token
+    request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Bearer {}'.format(token))
+    return CachedJWTAuthentication().authenticate(request)[0]
+
+
+def test_list_users_query_budget(admin_api_client):
+    User.objects.bulk_create([
+        User(email='patient{}@example.com'.format(i), username='patient{}@example.com'.format(i), role=Roles.PATIENT)
+        for i in range(50)
+    ])
+    with assert_max_queries(3):
+        response = admin_api_client.get(reverse('users-list'))
+    assert response.status_code == 200
+
+
+def test_cached_jwt_authentication_skips_user_query(shared_cache, doctor_user, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        authenticate(doctor_user)
+    with django_assert_num_queries(0):
+        user = authenticate(doctor_user)
+        assert user.role == Roles.DOCTOR
+        assert user.is_doctor()
+
+    cached = cache.get(get_user_cache_key(doctor_user.pk))
+    assert doctor_user.password not in cached
+    with django_assert_num_queries(1):
+        assert user.password == doctor_user.password
+
+
+def test_cached_jwt_authentication_needs_shared_cache(doctor_user, django_assert_num_queries):
+    for _ in range(2):
+        with django_assert_num_queries(1):
+            authenticate(doctor_user)
+    assert cache.get(get_user_cache_key(doctor_user.pk)) is None
+
+
+def test_cached_jwt_authentication_drops_changed_users(shared_cache, doctor_user, django_capture_on_commit_callbacks,
+                                                       django_assert_num_queries):
+    authenticate(doctor_user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        doctor_user.role = Roles.ADMIN
+        doctor_user.save()
+    assert authenticate(doctor_user).is_admin_user()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        doctor_user.delete()
+    with django_assert_num_queries(1):
+        authenticate(doctor_user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        doctor_user.is_active = False
+        doctor_user.save()
+    with pytest.raises(AuthenticationFailed):
+        authenticate(doctor_user)
+
+
+def test_import_users_reports_failed_rows(admin_api_client, doctor_user):
+    content = '\n'.join([
+        'first_name,last_name,email,password,role',
+        'Ann,Lee,ann@example.com,secret123,DOCTOR',
+        'Bob,Ray,not-an-email,secret123,PATIENT',
+        'Ann,Lee,ann@example.com,secret123,DOCTOR',
+        'Doc,Tor,doctor@example.com,secret123,DOCTOR',
+        'Cat,Fox,cat@example.com,secret123,PATIENT',
+    ])
+    url = reverse('users-bulk-import')
+    response = admin_api_client.post(url, {'file': SimpleUploadedFile('users.csv', content.encode())})
+
+    content = get_response_data(response)
+    assert response.status_code == 200
+    assert content['data']['created'] == 2
+    assert [error['row'] for error in content['data']['failed']] == [2, 3, 4]
+    assert content['data']['failed'][1]['errors'] == [AccountErrorCodes.IMPORT_DUPLICATE_EMAIL]
+    assert content['data']['failed'][2]['errors'] == [AccountErrorCodes.USER_EXIST]
+    ann = User.objects.get(username='ann@example.com')
+    assert ann.role == Roles.DOCTOR and ann.check_password('secret123')
+
+
+def test_import_users_rejects_oversized_and_undecodable_files(admin_api_client, monkeypatch):
+    monkeypatch.setattr(project_settings, 'USER_IMPORT_MAX_ROWS', 2)
+    url = reverse('users-bulk-import')
+    rows = ['first_name,last_name,email,password,role'] + [
+        'User,{0},user{0}@example.com,secret123,PATIENT'.format(i) for i in range(3)
+    ]
+    response = admin_api_client.post(url, {'file': SimpleUploadedFile('users.csv', '\n'.join(rows).encode())})
+    assert response.status_code == 400
+    assert assert_validation_error(response) == [AccountErrorCodes.IMPORT_TOO_MANY_ROWS]
+
+    response = admin_api_client.post(url, {'file': SimpleUploadedFile('users.csv', rows[0].encode() + b'\n\xff\xfe')})
+    assert response.status_code == 400
+    assert assert_validation_error(response) == [AccountErrorCodes.IMPORT_ENCODING_INVALID]
+    assert not User.objects.filter(username__startswith='user').exists()
+
+
+def test_import_users_rejects_emails_longer_than_usernames(db):
+    email = '{}@example.com'.format('a' * 150)
+    rows = [(1, {'first_name': 'Long', 'last_name': 'Email', 'email': email, 'password': 'secret123',
+                 'role': 'PATIENT'})]
+
+    created, failed = import_users(rows)
+
+    assert created == 0
+    assert failed[0]['row'] == 1
+    assert not User.objects.filter(email=email).exists()
+
+
+def test_import_users_hashes_passwords_in_worker_processes(db, settings):
+    settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    lines = [json.dumps({'first_name': 'User', 'last_name': str(i), 'email': 'user{}@example.com'.format(i),
+                         'password': 'secret{}'.format(i), 'role': 'PATIENT'}) for i in range(50)]
+    stream = io.BytesIO('\n'.join(lines[:10] + ['not json'] + lines[10:]).encode())
+
+    created, failed = import_users(read_user_rows(stream, 'jsonl'), chunk_size=16, workers=2)
+
+    assert created == 50
+    assert failed == [{'row': 11, 'errors': [AccountErrorCodes.IMPORT_ROW_INVALID]}]
+    assert User.objects.get(username='user42@example.com').check_password('secret42')
@@ -4,14 +4,16 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.viewsets import ViewSet, ModelViewSet
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.db.models import Q
 
+from apps.users.error_codes import AccountErrorCodes
 from apps.users.permissions import AnonWriteOnly, NotAllowed
 from apps.users.serializers import AuthRegisterSerializer, UserSerializer, PasswordChangeSerializer, \
-    ProfileUpdateSerializer, UserRequestResetPasswordSerializer, UserResetPasswordSerializer
+    ProfileUpdateSerializer, UserRequestResetPasswordSerializer, UserResetPasswordSerializer, UserImportSerializer
 from apps.users.models import User, Roles
-from apps.users.services import request_password_reset
+from apps.users.services import request_password_reset, get_import_format, import_users, read_user_rows
 from project import settings
 
 
@@ -91,3 +93,17 @@ class UserViewSet(ModelViewSet):
             if serializer.is_valid(raise_exception=True):
                 serializer.save()
             return serializer.data
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        serializer = UserImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file = serializer.validated_data['file']
+        import_format = serializer.validated_data.get('format') or get_import_format(file.name)
+        if import_format is None:
+            raise ValidationError(AccountErrorCodes.IMPORT_FORMAT_UNSUPPORTED)
+
+        # Passwords are hashed in this thread, the row count keeps the request short. Larger imports go
+        # through the import_users command
+        created, failed = import_users(read_user_rows(file, import_format), max_rows=settings.USER_IMPORT_MAX_ROWS)
+        return Response({'created': created, 'failed': failed})
@@ -0,0 +1,89 @@
+"""Contention benchmark for appointment booking.
+
+Fires BENCH_BOOKINGS concurrent bookings from BENCH_WORKERS threads at BENCH_SLOTS slots
+and reports throughput and conflict rate:
+
+    pytest benchmarks/bench_booking.py -s
+"""
+import queue
+import random
+import threading
+from datetime import date, time, timedelta
+
+import pytest
+from django.db import connection
+from django.db.models import Count
+
+from apps.common.exceptions import Conflict
+from apps.GPService.models import Availability, Appointment
+from apps.GPService.services import book_availability
+from apps.users.models import User, Roles
+from benchmarks.utils import env_int, report, Timer
+
+
+@pytest.mark.django_db(transaction=True)
+def test_booking_contention(doctor_user):
+    bookings = env_int('BENCH_BOOKINGS', 1000)
+    slots = env_int('BENCH_SLOTS', 50)
+    workers = env_int('BENCH_WORKERS', 32)
+
+    day = date.today() + timedelta(days=1)
+    availabilities = Availability.objects.bulk_create([
+        Availability(doctor=doctor_user, date=day, starting_time=time(9, 0), ending_time=time(9, 15))
+        for _ in range(slots)
+    ])
+    patients = User.objects.bulk_create([
+        User(email='patient{}@example.com'.format(i), username='patient{}@example.com'.format(i), role=Roles.PATIENT)
+        for i in range(workers)
+    ])
+
+    random.seed(0)
+    pending = queue.Queue()
+    for _ in range(bookings):
+        pending.put(random.choice(availabilities).pk)
+
+    results = {'booked': 0, 'conflicts': 0}
+    lock = threading.Lock()
+
+    def worker(patient):
+        booked = conflicts = 0
+        try:
+            while True:
+                try:
+                    availability_id = pending.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    book_availability(availability_id, patient)
+                    booked += 1
+                except Conflict:
+                    conflicts += 1
+        finally:
+            connection.close()
+        with lock:
+            results['booked'] += booked
+            results['conflicts'] += conflicts
+
+    threads = [threading.Thread(target=worker, args=(patient,)) for patient in patients]
+    with Timer() as timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    double_booked = Appointment.objects.values('availability').annotate(total=Count('id')).filter(total__gt=1)
+    assert not double_booked.exists()
+    assert results['booked'] == Appointment.objects.count() == Availability.objects.filter(is_booked=True).count()
+    assert results['booked'] + results['conflicts'] == bookings
+
+    report(
+        'booking contention',
+        bookings=bookings,
+        slots=slots,
+        workers=workers,
+        booked=results['booked'],
+        conflicts=results['conflicts'],
+        conflict_rate=results['conflicts'] / bookings,
+        seconds=timer.elapsed,
+        bookings_per_second=bookings / timer.elapsed,
+    )
@@ -0,0 +1,97 @@
+"""Email delivery over a local SMTP stub, one connection per email against batched connections:
+
+    pytest benchmarks/bench_email.py -s
+
+The stub waits `BENCH_SMTP_CONNECT_MS` before greeting to stand in for the TCP and TLS handshake of a
+real relay.
+"""
+import socketserver
+import threading
+import time
+
+from django.test import override_settings
+
+from apps.common.mail import EmailBatcher
+from apps.common.tasks import deliver_email, send_email_batch
+from benchmarks.utils import env_int, report, Timer
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        time.sleep(self.server.connect_delay)
+        self.reply('220 stub ESMTP')
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                self.server.messages += 1
+                self.reply('250 OK')
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay):
+        super().__init__(('127.0.0.1', 0), SMTPStubHandler)
+        self.connect_delay = connect_delay
+        self.connections = self.messages = 0
+
+
+def test_email_delivery_throughput():
+    emails = env_int('BENCH_EMAILS', 500)
+    batch_size = env_int('BENCH_EMAIL_BATCH_SIZE', 100)
+    server = SMTPStub(env_int('BENCH_SMTP_CONNECT_MS', 20) / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    payload = [
+        {'subject': 'Appointment reminder', 'to': 'patient{}@example.com'.format(index),
+         'message': 'Your appointment starts in one hour.'}
+        for index in range(emails)
+    ]
+    smtp_settings = override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+        EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.server_address[1],
+        EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', EMAIL_USE_TLS=False,
+    )
+    try:
+        with smtp_settings:
+            with Timer() as single:
+                for email in payload:
+                    deliver_email(**email)
+            single_connections = server.connections
+
+            batcher = EmailBatcher(send_email_batch, max_size=batch_size, max_age=1)
+            with Timer() as batched:
+                for email in payload:
+                    batcher.add(email)
+                batcher.flush()
+            batched_connections = server.connections - single_connections
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert server.messages == 2 * emails
+
+    report(
+        'email delivery',
+        emails=emails,
+        batch_size=batch_size,
+        single_connections=single_connections,
+        batched_connections=batched_connections,
+        single_emails_per_second=emails / single.elapsed,
+        batched_emails_per_second=emails / batched.elapsed,
+        speedup=single.elapsed / batched.elapsed,
+    )
@@ -0,0 +1,38 @@
+"""Per-message CPU cost of rendering an email, filesystem loading against the cached email engine:
+
+    pytest benchmarks/bench_email_templates.py -s
+"""
+from django.template.loader import render_to_string
+
+from apps.common.email_templates import EmailTemplates, render_email_template, warm_email_templates
+from benchmarks.utils import env_int, report, Timer
+
+
+def render_message(render, template, data):
+    return render(template.format('.txt'), {'data': data}), render(template.format('.html'), {'data': data})
+
+
+def test_email_template_render_cost():
+    messages = env_int('BENCH_EMAIL_RENDERS', 2000)
+    template = EmailTemplates.AUTH_VERIFICATION
+    data = {'verification_code': 123456}
+    warm_email_templates()
+
+    results = {}
+    for name, render in (('filesystem', render_to_string), ('cached', render_email_template)):
+        output = render_message(render, template, data)
+        with Timer() as timer:
+            for _ in range(messages):
+                render_message(render, template, data)
+        results[name] = (output, timer.elapsed)
+
+    assert results['filesystem'][0] == results['cached'][0]
+    filesystem_elapsed, cached_elapsed = results['filesystem'][1], results['cached'][1]
+
+    report(
+        'email template rendering',
+        messages=messages,
+        filesystem_us_per_message=filesystem_elapsed / messages * 10 ** 6,
+        cached_us_per_message=cached_elapsed / messages * 10 ** 6,
+        speedup=filesystem_elapsed / cached_elapsed,
+    )
@@ -0,0 +1,130 @@
+"""Throughput and latency of the main API endpoints over a synthetic dataset:
+
+    pytest benchmarks/bench_endpoints.py -s
+
+BENCH_DOCTORS doctors share BENCH_AVAILABILITIES availabilities (e.g. 1000 and 1000000 for production-like
+volumes). Results are written to benchmarks/results/endpoints.json (see BENCH_RESULTS_DIR). To flag
+regressions, copy a previous results file and point BENCH_BASELINE at it: the run fails when an endpoint's
+median latency grows, or its throughput drops, by more than BENCH_REGRESSION_PCT percent (20 by default).
+"""
+import itertools
+import os
+import random
+from datetime import date, time, timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from apps.GPService.models import Availability
+from apps.users.models import User, Roles
+from apps.users.tests.fixtures import ApiClient
+from benchmarks.utils import env_int, find_regressions, measure, report, save_results, Timer
+
+SLOTS_PER_DAY = 32
+BATCH_SIZE = 10000
+
+
+def seed_availabilities(doctors, count):
+    """Spread `count` free slots over the doctors, 15 minutes apart from 8:00 and day after day."""
+    start = date.today() + timedelta(days=1)
+
+    def build(index):
+        doctor, slot = doctors[index % len(doctors)], index // len(doctors)
+        minutes = 8 * 60 + slot % SLOTS_PER_DAY * 15
+        return Availability(
+            doctor=doctor, date=start + timedelta(days=slot // SLOTS_PER_DAY),
+            starting_time=time(minutes // 60, minutes % 60),
+            ending_time=time((minutes + 15) // 60, (minutes + 15) % 60),
+        )
+
+    availabilities = (build(index) for index in range(count))
+    while True:
+        batch = list(itertools.islice(availabilities, BATCH_SIZE))
+        if not batch:
+            return
+        Availability.objects.bulk_create(batch)
+
+
+def assert_status(response, status_code):
+    assert response.status_code == status_code, response.content
+    return response
+
+
+def test_endpoint_baseline(admin_user, doctor_user, api_client, settings, tmp_path):
+    doctor_count = env_int('BENCH_DOCTORS', 100)
+    availability_count = env_int('BENCH_AVAILABILITIES', 20000)
+    requests = env_int('BENCH_REQUESTS', 200)
+    token_requests = env_int('BENCH_TOKEN_REQUESTS', 20)
+    file_size = env_int('BENCH_FILE_KB', 64) * 1024
+    settings.MEDIA_ROOT = str(tmp_path)
+
+    with Timer() as seeding:
+        doctors = User.objects.bulk_create([
+            User(email='doctor{}@example.com'.format(i), username='doctor{}@example.com'.format(i),
+                 first_name='doctor{}'.format(i), role=Roles.DOCTOR)
+            for i in range(doctor_count)
+        ], batch_size=BATCH_SIZE)
+        seed_availabilities(doctors, availability_count)
+    days = max(availability_count // doctor_count // SLOTS_PER_DAY, 1)
+
+    admin_client = ApiClient(user=admin_user)
+    doctor_client = ApiClient(user=doctor_user)
+    random.seed(0)
+
+    def obtain_token(index):
+        assert_status(api_client.post(reverse('token_obtain_pair'), {
+            'username': doctor_user.username, 'password': 'password'
+        }), 200)
+
+    def list_availabilities(index):
+        day = date.today() + timedelta(days=1 + random.randrange(days))
+        params = {'doctor': str(random.choice(doctors).pk), 'date': day.isoformat()}
+        assert_status(doctor_client.get(reverse('availabilities-list'), params), 200)
+
+    def create_availability(index):
+        day = date.today() + timedelta(days=days + 1 + index // SLOTS_PER_DAY)
+        minutes = 8 * 60 + index % SLOTS_PER_DAY * 15
+        assert_status(doctor_client.post(reverse('availabilities-list'), {
+            'date': day.isoformat(),
+            'starting_time': '{:02}:{:02}'.format(minutes // 60, minutes % 60),
+            'ending_time': '{:02}:{:02}'.format((minutes + 15) // 60, (minutes + 15) % 60),
+        }, format='json'), 201)
+
+    files = []
+
+    def upload_file(index):
+        content = index.to_bytes(4, 'big') * (file_size // 4)
+        response = assert_status(api_client.post(reverse('files-list'), {
+            'file': SimpleUploadedFile('scan{}.pdf'.format(index), content)
+        }), 201)
+        files.append(response.data['id'])
+
+    def download_file(index):
+        response = assert_status(api_client.get(reverse('files-download', args=[files[index % len(files)]])), 200)
+        b''.join(response.streaming_content)
+
+    def list_users(index):
+        assert_status(admin_client.get(reverse('users-list')), 200)
+
+    results = {
+        'auth_token_obtain': measure(obtain_token, token_requests),
+        'availability_list': measure(list_availabilities, requests),
+        'availability_create': measure(create_availability, requests),
+        'file_upload': measure(upload_file, requests),
+        'file_download': measure(download_file, requests),
+        'user_list': measure(list_users, requests),
+    }
+    path = save_results(
+        'endpoints', results, doctors=doctor_count, availabilities=availability_count, requests=requests,
+        file_size=file_size,
+    )
+
+    report('seeding', doctors=doctor_count, availabilities=availability_count, seconds=seeding.elapsed)
+    for name, metrics in results.items():
+        report(name, **metrics)
+    print('\nResults written to {}'.format(path))
+
+    baseline = os.getenv('BENCH_BASELINE')
+    if baseline:
+        regressions = find_regressions(results, baseline, env_int('BENCH_REGRESSION_PCT', 20))
+        assert not regressions, 'Regressions against {}:\n{}'.format(baseline, '\n'.join(regressions))
@@ -0,0 +1,61 @@
+"""Medicine autocomplete latency on a large catalog, in-process prefix index against the full-text index:
+
+    pytest benchmarks/bench_medicine_search.py -s
+"""
+import random
+import statistics
+
+from apps.GPService.catalog import MedicinePrefixIndex
+from apps.GPService.models import Medicine, MedicineType
+from apps.GPService.services import search_medicines
+from benchmarks.utils import env_int, report, Timer
+
+SYLLABLES = ['par', 'ace', 'ta', 'mol', 'ibu', 'pro', 'fen', 'amo', 'xi', 'cil', 'lin', 'met', 'for', 'min',
+             'ator', 'va', 'stat', 'lo', 'sar', 'tan', 'om', 'epra', 'zole', 'cet', 'iri', 'zine', 'dex', 'tro']
+
+
+def percentile(samples, fraction):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def test_medicine_autocomplete_latency(db):
+    medicines = env_int('BENCH_MEDICINES', 100000)
+    queries = env_int('BENCH_QUERIES', 500)
+
+    random.seed(0)
+    Medicine.objects.bulk_create([
+        Medicine(
+            name=' '.join(''.join(random.choices(SYLLABLES, k=random.randint(2, 4))).capitalize()
+                          for _ in range(random.randint(1, 2))) + ' {}mg'.format(random.choice([5, 50, 250, 500])),
+            type=random.choice(MedicineType.values),
+            available_quantity=100,
+            price=5
+        )
+        for _ in range(medicines)
+    ], batch_size=5000)
+    prefixes = [''.join(random.choices(SYLLABLES, k=2))[:random.randint(1, 5)] for _ in range(queries)]
+
+    # Built in the benchmark thread, a background thread would not see the test transaction
+    index = MedicinePrefixIndex(background=False)
+    with Timer() as build:
+        index.refresh()
+
+    latencies = {'index': [], 'database': []}
+    for prefix in prefixes:
+        with Timer() as timer:
+            index.search(prefix, limit=10)
+        latencies['index'].append(timer.elapsed * 1000)
+        with Timer() as timer:
+            list(search_medicines(prefix)[:10])
+        latencies['database'].append(timer.elapsed * 1000)
+
+    report(
+        'medicine autocomplete',
+        medicines=medicines,
+        queries=queries,
+        index_build_seconds=build.elapsed,
+        index_p50_ms=statistics.median(latencies['index']),
+        index_p99_ms=percentile(latencies['index'], 0.99),
+        database_p50_ms=statistics.median(latencies['database']),
+        database_p99_ms=percentile(latencies['database'], 0.99),
+    )
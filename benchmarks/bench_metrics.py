@@ -0,0 +1,35 @@
+"""Per-request cost of recording latency metrics, a bare view against the same view behind MetricsMiddleware:
+
+    pytest benchmarks/bench_metrics.py -s
+"""
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from apps.common.metrics import MetricsMiddleware, record_phase
+from benchmarks.utils import env_int, report, Timer
+
+
+def view(request):
+    with record_phase('render'):
+        return HttpResponse(b'{}')
+
+
+def test_metrics_recording_overhead(db):
+    requests = env_int('BENCH_METRICS_REQUESTS', 20000)
+    request = RequestFactory().get('/api/bench/')
+    middleware = MetricsMiddleware(lambda request: middleware.process_view(request, view, (), {}) or view(request))
+
+    results = {}
+    for name, handle in (('bare', view), ('recorded', middleware)):
+        with Timer() as timer:
+            for _ in range(requests):
+                handle(request)
+        results[name] = timer.elapsed
+
+    report(
+        'metrics recording',
+        requests=requests,
+        bare_us_per_request=results['bare'] / requests * 10 ** 6,
+        recorded_us_per_request=results['recorded'] / requests * 10 ** 6,
+        overhead_us_per_request=(results['recorded'] - results['bare']) / requests * 10 ** 6,
+    )
@@ -0,0 +1,68 @@
+"""Repricing every order with the set-based pricing engine against computing totals order by order:
+
+    pytest benchmarks/bench_order_pricing.py -s
+"""
+import random
+from datetime import date, time, timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.GPService.models import Appointment, Availability, Medicine, MedicineType, Order, OrderType, Prescription
+from apps.GPService.services import reprice_all_orders
+from benchmarks.utils import env_int, report, Timer
+
+
+def naive_total(order):
+    total = 0
+    for prescription in Prescription.objects.filter(appointment_id=order.appointment_id):
+        total += prescription.prescribed_quantity * Medicine.objects.get(pk=prescription.medicine_id).price
+    return total + Availability.objects.get(appointments=order.appointment_id).doctor_charge
+
+
+def test_order_pricing_throughput(doctor_user, patient_user):
+    orders = env_int('BENCH_ORDERS', 1000)
+    random.seed(0)
+
+    medicines = Medicine.objects.bulk_create([
+        Medicine(name='Medicine {}'.format(i), type=MedicineType.TABLET, available_quantity=100,
+                 price=random.randint(100, 9999) / 100)
+        for i in range(50)
+    ])
+    day = date.today() + timedelta(days=1)
+    availabilities = Availability.objects.bulk_create([
+        Availability(doctor=doctor_user, date=day, starting_time=time(9, 0), ending_time=time(9, 15),
+                     doctor_charge=random.randint(50, 200))
+        for _ in range(orders)
+    ])
+    appointments = Appointment.objects.bulk_create([
+        Appointment(patient=patient_user, availability=availability) for availability in availabilities
+    ])
+    Prescription.objects.bulk_create([
+        Prescription(medicine=medicine, prescribed_quantity=random.randint(1, 5), appointment=appointment,
+                     is_accepted=True)
+        for appointment in appointments for medicine in random.sample(medicines, 3)
+    ])
+    Order.objects.bulk_create([
+        Order(type=OrderType.VIDEO_ASSESSMENT, appointment=appointment, created_date=timezone.now())
+        for appointment in appointments
+    ])
+
+    # The query log keeps the last 9000 queries, keep BENCH_ORDERS under 2000 for exact counts
+    with CaptureQueriesContext(connection) as engine_queries, Timer() as engine:
+        assert reprice_all_orders() == orders
+    with CaptureQueriesContext(connection) as naive_queries, Timer() as naive:
+        expected = {order.pk: naive_total(order) for order in Order.objects.all()}
+
+    assert dict(Order.objects.values_list('pk', 'total_amount')) == expected
+
+    report(
+        'order pricing',
+        orders=orders,
+        naive_queries=len(naive_queries),
+        engine_queries=len(engine_queries),
+        naive_seconds=naive.elapsed,
+        engine_seconds=engine.elapsed,
+        speedup=naive.elapsed / engine.elapsed,
+    )
@@ -0,0 +1,59 @@
+"""Throughput of the response renderers on large list payloads:
+
+    pytest benchmarks/bench_renderer.py -s
+"""
+import uuid
+from collections import OrderedDict
+from datetime import date, time, timedelta
+
+from rest_framework.response import Response
+
+from project.renderer import CustomJSONRenderer, FastJSONRenderer
+from benchmarks.utils import env_int, report, Timer
+
+
+def build_payload(rows):
+    day = date.today()
+    return [
+        OrderedDict([
+            ('id', index),
+            ('doctor', str(uuid.uuid4())),
+            ('date', (day + timedelta(days=index % 30)).isoformat()),
+            ('starting_time', time(9, (index % 4) * 15).isoformat()),
+            ('ending_time', time(9, (index % 4) * 15 + 14).isoformat()),
+            ('doctor_charge', 100 + index % 50),
+            ('is_booked', index % 3 == 0),
+            ('notes', 'Follow-up consultation for patient #{}'.format(index)),
+        ])
+        for index in range(rows)
+    ]
+
+
+def test_renderer_throughput():
+    rows = env_int('BENCH_RENDER_ROWS', 10000)
+    iterations = env_int('BENCH_RENDER_ITERATIONS', 20)
+    payload = build_payload(rows)
+    renderer_context = {'response': Response()}
+
+    results = {}
+    for renderer in (CustomJSONRenderer(), FastJSONRenderer()):
+        output = renderer.render(payload, 'application/json', renderer_context)
+        with Timer() as timer:
+            for _ in range(iterations):
+                renderer.render(payload, 'application/json', renderer_context)
+        results[type(renderer).__name__] = (output, timer.elapsed)
+
+    custom_output, custom_elapsed = results['CustomJSONRenderer']
+    fast_output, fast_elapsed = results['FastJSONRenderer']
+    assert fast_output == custom_output
+
+    report(
+        'renderer throughput',
+        rows=rows,
+        payload_bytes=len(custom_output),
+        custom_renders_per_second=iterations / custom_elapsed,
+        fast_renders_per_second=iterations / fast_elapsed,
+        custom_mb_per_second=len(custom_output) * iterations / custom_elapsed / 2 ** 20,
+        fast_mb_per_second=len(fast_output) * iterations / fast_elapsed / 2 ** 20,
+        speedup=custom_elapsed / fast_elapsed,
+    )
@@ -0,0 +1,93 @@
+"""Contention benchmark for medicine stock reservations.
+
+Fires BENCH_RESERVATIONS single and multi-item reservations from BENCH_WORKERS threads at BENCH_MEDICINES
+medicines holding BENCH_STOCK units each, then checks that no unit was lost or sold twice:
+
+    pytest benchmarks/bench_stock.py -s
+"""
+import queue
+import random
+import threading
+
+import pytest
+from django.db import connection
+from django.db.models import Sum
+
+from apps.common.exceptions import Conflict
+from apps.GPService.models import Medicine, MedicineType, StockReservation
+from apps.GPService.services import reserve_stock, reserve_stock_bulk
+from benchmarks.utils import env_int, report, Timer
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stock_reservation_contention():
+    reservations = env_int('BENCH_RESERVATIONS', 2000)
+    medicine_count = env_int('BENCH_MEDICINES', 5)
+    stock = env_int('BENCH_STOCK', 500)
+    workers = env_int('BENCH_WORKERS', 32)
+
+    medicines = Medicine.objects.bulk_create([
+        Medicine(name='Medicine {}'.format(i), type=MedicineType.TABLET, available_quantity=stock, price=5)
+        for i in range(medicine_count)
+    ])
+
+    random.seed(0)
+    pending = queue.Queue()
+    for _ in range(reservations):
+        pending.put([
+            {'medicine_id': medicine.pk, 'quantity': random.randint(1, 3)}
+            for medicine in random.sample(medicines, random.randint(1, min(3, medicine_count)))
+        ])
+
+    results = {'reserved': 0, 'conflicts': 0, 'units': 0}
+    lock = threading.Lock()
+
+    def worker():
+        reserved = conflicts = units = 0
+        try:
+            while True:
+                try:
+                    items = pending.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    if len(items) == 1:
+                        reserve_stock(items[0]['medicine_id'], items[0]['quantity'])
+                    else:
+                        reserve_stock_bulk(items)
+                    reserved += 1
+                    units += sum(item['quantity'] for item in items)
+                except Conflict:
+                    conflicts += 1
+        finally:
+            connection.close()
+        with lock:
+            results['reserved'] += reserved
+            results['conflicts'] += conflicts
+            results['units'] += units
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    with Timer() as timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    for medicine in Medicine.objects.annotate(reserved=Sum('reservations__quantity')):
+        assert medicine.available_quantity >= 0
+        assert medicine.available_quantity + (medicine.reserved or 0) == stock
+    assert results['units'] == StockReservation.objects.aggregate(total=Sum('quantity'))['total']
+    assert results['reserved'] + results['conflicts'] == reservations
+
+    report(
+        'stock reservation contention',
+        reservations=reservations,
+        medicines=medicine_count,
+        workers=workers,
+        reserved=results['reserved'],
+        conflicts=results['conflicts'],
+        units_reserved=results['units'],
+        units_left=stock * medicine_count - results['units'],
+        seconds=timer.elapsed,
+        reservations_per_second=reservations / timer.elapsed,
+    )
@@ -0,0 +1,41 @@
+"""Bulk user import with passwords hashed in one process against all cores:
+
+    pytest benchmarks/bench_user_import.py -s
+"""
+import io
+import json
+import os
+
+from apps.users.models import User
+from apps.users.services import import_users, read_user_rows
+from benchmarks.utils import env_int, report, Timer
+
+
+def build_jsonl(users, prefix):
+    return io.BytesIO('\n'.join(
+        json.dumps({'first_name': 'User', 'last_name': str(index), 'email': '{}{}@example.com'.format(prefix, index),
+                    'password': 'secret{}'.format(index), 'role': 'PATIENT'})
+        for index in range(users)
+    ).encode())
+
+
+def test_user_import_throughput(db):
+    users = env_int('BENCH_IMPORT_USERS', 200)
+    workers = env_int('BENCH_IMPORT_WORKERS', os.cpu_count())
+
+    with Timer() as single:
+        single_created, _ = import_users(read_user_rows(build_jsonl(users, 'single'), 'jsonl'), workers=1)
+    with Timer() as parallel:
+        parallel_created, _ = import_users(read_user_rows(build_jsonl(users, 'parallel'), 'jsonl'), workers=workers)
+
+    assert single_created == parallel_created == users
+    assert User.objects.count() == 2 * users
+
+    report(
+        'user import',
+        users=users,
+        workers=workers,
+        single_users_per_second=users / single.elapsed,
+        parallel_users_per_second=users / parallel.elapsed,
+        speedup=single.elapsed / parallel.elapsed,
+    )
@@ -0,0 +1,73 @@
+"""Doctors pulling form assessments off the work queue concurrently:
+
+    pytest benchmarks/bench_work_queue.py -s
+
+BENCH_REVIEWERS doctors lease BENCH_LEASE_SIZE forms at a time out of BENCH_FORMS and complete them,
+every form must be assessed exactly once.
+"""
+import statistics
+import threading
+from collections import Counter
+
+import pytest
+from django.db import connection
+
+from apps.GPService.models import FormAssessment, FormAssessmentType
+from apps.GPService.services import complete_form_assessment, lease_form_assessments
+from apps.users.models import User, Roles
+from benchmarks.utils import env_int, report, Timer
+
+
+@pytest.mark.django_db(transaction=True)
+def test_work_queue_distribution(patient_user):
+    forms = env_int('BENCH_FORMS', 2000)
+    reviewers = env_int('BENCH_REVIEWERS', 16)
+    lease_size = env_int('BENCH_LEASE_SIZE', 5)
+
+    FormAssessment.objects.bulk_create([
+        FormAssessment(patient=patient_user, type=FormAssessmentType.ONE_TIME_FORM) for _ in range(forms)
+    ])
+    doctors = User.objects.bulk_create([
+        User(email='doctor{}@example.com'.format(i), username='doctor{}@example.com'.format(i), role=Roles.DOCTOR)
+        for i in range(reviewers)
+    ])
+
+    completed = Counter()
+    lock = threading.Lock()
+
+    def review(doctor):
+        done = 0
+        try:
+            while True:
+                assessments = list(lease_form_assessments(doctor, lease_size))
+                if not assessments:
+                    break
+                for assessment in assessments:
+                    complete_form_assessment(assessment.pk, doctor)
+                    done += 1
+        finally:
+            connection.close()
+        with lock:
+            completed[doctor.pk] = done
+
+    threads = [threading.Thread(target=review, args=(doctor,)) for doctor in doctors]
+    with Timer() as timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert sum(completed.values()) == forms
+    assert FormAssessment.objects.filter(is_assessed=True).count() == forms
+
+    report(
+        'form assessment work queue',
+        forms=forms,
+        reviewers=reviewers,
+        lease_size=lease_size,
+        seconds=timer.elapsed,
+        forms_per_second=forms / timer.elapsed,
+        min_forms_per_reviewer=min(completed.values()),
+        max_forms_per_reviewer=max(completed.values()),
+        stdev_forms_per_reviewer=statistics.pstdev(completed.values()),
+    )
@@ -0,0 +1,90 @@
+import json
+import math
+import os
+import platform
+import time
+from datetime import datetime
+
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def report(name, **metrics):
+    print('\n[{}]'.format(name))
+    for key, value in metrics.items():
+        if isinstance(value, float):
+            value = '{:.4f}'.format(value)
+        print('  {:<28} {}'.format(key, value))
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def measure(call, requests):
+    """Call `call(index)` `requests` times, returns the throughput and latency percentiles in milliseconds."""
+    latencies = []
+    with Timer() as total:
+        for index in range(requests):
+            start = time.perf_counter()
+            call(index)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        'requests': requests,
+        'requests_per_second': requests / total.elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+def save_results(name, results, **parameters):
+    """Write results to BENCH_RESULTS_DIR/<name>.json (benchmarks/results by default), returns the path."""
+    directory = os.getenv('BENCH_RESULTS_DIR', os.path.join(os.path.dirname(__file__), 'results'))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '{}.json'.format(name))
+    with open(path, 'w') as f:
+        json.dump({
+            'name': name,
+            'created': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'parameters': parameters,
+            'results': results,
+        }, f, indent=2)
+    return path
+
+
+def find_regressions(results, baseline_path, tolerance_pct):
+    """Compare results with a file written by `save_results`.
+
+    Returns a message for every endpoint whose median latency grew, or throughput dropped, by more than
+    `tolerance_pct` percent. Tail percentiles move too much between runs of a few hundred requests to be compared.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+
+    regressions = []
+    limit = 1 + tolerance_pct / 100
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * limit:
+            regressions.append('{}: p50 {:.2f}ms, was {:.2f}ms'.format(name, current['p50_ms'], previous['p50_ms']))
+        if current['requests_per_second'] * limit < previous['requests_per_second']:
+            regressions.append('{}: {:.1f} requests/s, was {:.1f}'.format(
+                name, current['requests_per_second'], previous['requests_per_second']
+            ))
+    return regressions
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_asgi_application()
+
+from apps.common.email_templates import warm_email_templates  # noqa: E402
+
+warm_email_templates()
@@ -5,6 +5,7 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import exception_handler
 
+from apps.common.metrics import record_exception
 from project import settings
 
 logger = logging.getLogger("project.exception_handler")
@@ -14,6 +15,7 @@ def custom_exception_handler(exc, context):
     # Call REST framework's default exception handler first,
     # to get the standard error response.
     response = exception_handler(exc, context)
+    record_exception(exc)
 
     message = type(exc).__name__
     default_error = ' '.join(re.findall(r'[A-Z](?:[a-z]+|[A-Z]*(?=[A-Z]|$))', message))
@@ -1,9 +1,20 @@
 from rest_framework.renderers import JSONRenderer
 
+from apps.common.metrics import record_phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class CustomJSONRenderer(JSONRenderer):
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
+        with record_phase('render'):
+            return self.render_envelope(data, accepted_media_type, renderer_context)
+
+    def render_envelope(self, data, accepted_media_type=None, renderer_context=None):
         response_data = {}
 
         if data is not None:
@@ -27,3 +38,53 @@ class CustomJSONRenderer(JSONRenderer):
         response = super(CustomJSONRenderer, self).render(response_data, accepted_media_type, renderer_context)
 
         return response
+
+
+class FastJSONRenderer(CustomJSONRenderer):
+    """Renders the same envelope as `CustomJSONRenderer` straight to bytes with orjson.
+
+    Values orjson does not handle natively (dates, decimals, lazy strings...) go through the DRF encoder.
+    The output decodes to the same data but is not always the same bytes: floats in exponent notation are
+    written the shortest way (`1e16`, `1e-7` where json writes `1e+16`, `1e-07`) and non-finite floats are
+    written as null instead of failing.
+    Falls back to `CustomJSONRenderer` for indented output, when orjson is not installed or when it cannot
+    encode the data (e.g. integers larger than 64 bits).
+    """
+    encoder_default = JSONRenderer.encoder_class().default
+
+    def dumps(self, data):
+        return orjson.dumps(
+            data,
+            default=self.encoder_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+    def render_envelope(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self.compact \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render_envelope(data, accepted_media_type, renderer_context)
+
+        try:
+            if data is not None:
+                parts = []
+                if 'message' in data:
+                    parts.append(b'"message":' + self.dumps(data['message']))
+
+                if 'errors' in data:
+                    parts.append(b'"status":"ERROR"')
+                    parts.append(b'"errors":' + self.dumps(data['errors']))
+                else:
+                    parts.append(b'"status":"OK"')
+                    parts.append(b'"data":' + self.dumps(data))
+                ret = b'{' + b','.join(parts) + b'}'
+
+            elif renderer_context['response'].status_code == 204:
+                return b''
+
+            else:
+                return b'{"message":"success"}'
+        except orjson.JSONEncodeError:
+            return super().render_envelope(data, accepted_media_type, renderer_context)
+
+        # Same escaping as JSONRenderer, keeps the output a strict javascript subset
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
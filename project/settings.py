@@ -18,6 +18,15 @@ from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+
+def env_bool(name, default):
+    """Boolean from the environment, "False", "0", "no" and "off" (any case) turn it off."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
 
@@ -48,6 +57,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.common.metrics.MetricsMiddleware',
+    'apps.common.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -95,6 +106,17 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Use a shared backend (e.g. memcached) in production so invalidations reach every worker
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -134,7 +156,7 @@ STATIC_URL = os.getenv('DJANGO_STATIC_URL', '/static/')
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_RENDERER_CLASSES': (
-        'project.renderer.CustomJSONRenderer',
+        'project.renderer.FastJSONRenderer',
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
@@ -143,7 +165,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     )
@@ -160,6 +182,14 @@ SIMPLE_JWT = {
 
 AUTH_USER_MODEL = 'users.User'
 
+# Seconds a user authenticated by a JWT stays cached, saving or deleting the user drops it right away.
+# Only applies with a cache shared by all workers, users are not cached with the default LocMemCache.
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('DJANGO_AUTH_USER_CACHE_TIMEOUT', 300))
+
+# Rows accepted by the user import endpoint, which hashes passwords within the request (about 150ms each with
+# PBKDF2, so 20 rows take about 3s). Use the import_users command for more
+USER_IMPORT_MAX_ROWS = int(os.getenv('DJANGO_USER_IMPORT_MAX_ROWS', 20))
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_CREDENTIALS = True
 
@@ -171,6 +201,20 @@ EMAIL_PORT = os.getenv('DJANGO_EMAIL_PORT', 587)
 EMAIL_USE_TLS = os.getenv('DJANGO_EMAIL_USE_TLS', True)
 EMAIL_FROM_ADDRESS = os.getenv('DJANGO_EMAIL_FROM_ADDRESS', 'support@project.apps.avantrio.xyz')
 
+# With Celery every email is queued on the broker as soon as it is sent, and retried by the worker
+# EMAIL_DELIVERY_RETRIES times. On Zappa every email is sent from its own asynchronous Lambda invocation.
+# Otherwise emails are queued in
+# memory and sent from background threads in batches over one connection, a batch goes out once it is full or
+# its oldest email waited EMAIL_BATCH_MAX_AGE seconds. Without background sending every email is sent on its
+# own within the request.
+EMAIL_SEND_IN_BACKGROUND = env_bool('DJANGO_EMAIL_SEND_IN_BACKGROUND', True)
+EMAIL_BATCH_SIZE = int(os.getenv('DJANGO_EMAIL_BATCH_SIZE', 100))
+EMAIL_BATCH_MAX_AGE = float(os.getenv('DJANGO_EMAIL_BATCH_MAX_AGE', 2))
+EMAIL_QUEUE_SIZE = int(os.getenv('DJANGO_EMAIL_QUEUE_SIZE', 1000))
+EMAIL_DELIVERY_WORKERS = int(os.getenv('DJANGO_EMAIL_DELIVERY_WORKERS', 2))
+EMAIL_DELIVERY_RETRIES = int(os.getenv('DJANGO_EMAIL_DELIVERY_RETRIES', 3))
+EMAIL_DELIVERY_BACKOFF = float(os.getenv('DJANGO_EMAIL_DELIVERY_BACKOFF', 1))
+
 # Send Emails to console when DEBUG is on
 if DEBUG:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -188,6 +232,56 @@ SELF_REGISTER = os.getenv('DJANGO_SELF_REGISTER', True)
 
 # File Upload Config
 ANONYMOUS_FILE_UPLOAD = os.getenv('DJANGO_ANONYMOUS_FILE_UPLOAD', True)
+# Uploaded files are hashed while they stream in so identical content is stored once
+FILE_UPLOAD_HANDLERS = [
+    'apps.files.upload_handlers.HashingMemoryFileUploadHandler',
+    'apps.files.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+# Bytes of an upload kept in memory, larger files and chunks are spooled to a temporary file
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('DJANGO_FILE_UPLOAD_MAX_MEMORY_SIZE', 2621440))
+# Resumable uploads, a chunk is streamed to storage FILE_UPLOAD_READ_SIZE bytes at a time
+FILE_UPLOAD_MAX_CHUNK_SIZE = int(os.getenv('DJANGO_FILE_UPLOAD_MAX_CHUNK_SIZE', 16 * 1024 * 1024))
+FILE_UPLOAD_READ_SIZE = int(os.getenv('DJANGO_FILE_UPLOAD_READ_SIZE', 64 * 1024))
+# Seconds a resumable upload is kept without receiving a chunk before it is aborted and its content deleted
+FILE_UPLOAD_EXPIRE = int(os.getenv('DJANGO_FILE_UPLOAD_EXPIRE', 24 * 60 * 60))
+
+# Availability Config
+AVAILABILITY_LIST_CACHE_TIMEOUT = int(os.getenv('DJANGO_AVAILABILITY_LIST_CACHE_TIMEOUT', 300))
+
+# Seconds reserved medicine stock is held before it is released back
+STOCK_RESERVATION_TTL = int(os.getenv('DJANGO_STOCK_RESERVATION_TTL', 900))
+
+# Seconds the in-process medicine autocomplete index is used before being rebuilt, it is also rebuilt
+# as soon as a medicine changes
+MEDICINE_PREFIX_INDEX_TTL = int(os.getenv('DJANGO_MEDICINE_PREFIX_INDEX_TTL', 600))
+
+# Seconds question sets and recommended vaccines are kept in process memory. They are reloaded as soon as
+# they change when the cache backend is shared by every process, after this many seconds otherwise
+PROCESS_CACHE_TTL = int(os.getenv('DJANGO_PROCESS_CACHE_TTL', 300))
+
+# Seconds a doctor holds a form assessment leased from the work queue before others can take it
+FORM_ASSESSMENT_LEASE_TIMEOUT = int(os.getenv('DJANGO_FORM_ASSESSMENT_LEASE_TIMEOUT', 900))
+
+# Query counting, requests running more queries than the warning threshold or repeating a query shape (N+1 queries)
+# are logged. The figures are also returned in response headers when DJANGO_QUERY_COUNT_HEADERS is on, off by
+# default as DEBUG is on unless DEBUG=1 is set and would expose them in production
+QUERY_COUNT_HEADERS = env_bool('DJANGO_QUERY_COUNT_HEADERS', False)
+QUERY_COUNT_WARNING_THRESHOLD = int(os.getenv('DJANGO_QUERY_COUNT_WARNING_THRESHOLD', 50))
+QUERY_COUNT_DUPLICATE_THRESHOLD = int(os.getenv('DJANGO_QUERY_COUNT_DUPLICATE_THRESHOLD', 5))
+
+# Prometheus metrics served on /metrics to requests sending `Authorization: Bearer <METRICS_TOKEN>`, every request
+# is denied while no token is set. With several worker processes PROMETHEUS_MULTIPROC_DIR must point to a directory shared by the gunicorn and
+# Celery workers and emptied before they start, so the metrics of every process are added up
+METRICS_ENABLED = env_bool('DJANGO_METRICS_ENABLED', True)
+METRICS_TOKEN = os.getenv('DJANGO_METRICS_TOKEN', '')
+
+# File Download Config
+# Downloads are streamed in chunks unless the front-end server (X-Accel-Redirect prefix mapped to MEDIA_ROOT)
+# or S3 (presigned URL redirect) can serve the bytes directly
+FILE_DOWNLOAD_CHUNK_SIZE = int(os.getenv('DJANGO_FILE_DOWNLOAD_CHUNK_SIZE', 64 * 1024))
+FILE_DOWNLOAD_ACCEL_REDIRECT_PREFIX = os.getenv('DJANGO_FILE_DOWNLOAD_ACCEL_REDIRECT_PREFIX', '')
+FILE_DOWNLOAD_S3_REDIRECT = env_bool('DJANGO_FILE_DOWNLOAD_S3_REDIRECT', True)
+FILE_DOWNLOAD_S3_REDIRECT_EXPIRE = int(os.getenv('DJANGO_FILE_DOWNLOAD_S3_REDIRECT_EXPIRE', 300))
 
 # Storage Configuration
 # Default Storage Types: AWS, DEFAULT for local storage
@@ -246,6 +340,20 @@ if ENABLE_CELERY:
     CELERY_BACKEND_URL = os.environ.get("CELERY_BACKEND_URL", 'redis://localhost:6379/0')
     CELERY_TASK_ACKS_LATE = True
     CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+    CELERY_BEAT_SCHEDULE = {
+        'release-expired-stock-reservations': {
+            'task': 'apps.GPService.tasks.release_expired_stock_reservations',
+            'schedule': 60,
+        },
+        'abort-expired-file-uploads': {
+            'task': 'apps.files.tasks.abort_expired_file_uploads',
+            'schedule': 60 * 60,
+        },
+        'delete-orphaned-file-blobs': {
+            'task': 'apps.files.tasks.delete_orphaned_file_blobs',
+            'schedule': 24 * 60 * 60,
+        },
+    }
 
 # Zappa Config
 ENABLE_ZAPPA = os.getenv('ENABLE_ZAPPA', False)
@@ -24,15 +24,22 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 
+from apps.common.views import metrics
 from apps.files.views import FileViewSet
 from apps.users.views import AuthViewSet, UserViewSet
-from apps.GPService.views import AvailabilityViewSet
+from apps.GPService.views import AvailabilityViewSet, MedicineViewSet, OrderViewSet, \
+    FormAssessmentQuestionViewSet, FormAssessmentViewSet, RecommendedVaccineViewSet
 
 router = DefaultRouter()
 router.register('auth', AuthViewSet, basename='auth')
 router.register('users', UserViewSet, basename='users')
 router.register('files', FileViewSet, basename='files')
 router.register('availabilities', AvailabilityViewSet, basename='availabilities')
+router.register('medicines', MedicineViewSet, basename='medicines')
+router.register('orders', OrderViewSet, basename='orders')
+router.register('questions', FormAssessmentQuestionViewSet, basename='questions')
+router.register('form-assessments', FormAssessmentViewSet, basename='form-assessments')
+router.register('vaccines', RecommendedVaccineViewSet, basename='vaccines')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -40,6 +47,8 @@ urlpatterns = [
 
     path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG: